@@ -0,0 +1,200 @@
+"""
+Benchmarks for the calculator engine hot paths
+Times parsing, validation, extraction, evaluation and formatting over
+realistic corpora and optionally compares against a saved baseline.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from calculator_engine import FeetInchesCalculator
+
+
+def _random_measurement(rng: random.Random) -> str:
+    """Return a random measurement in one of the supported notations"""
+    feet = rng.randint(0, 20)
+    inches = rng.randint(0, 11)
+    denominator = rng.choice([2, 4, 8, 16, 32, 64])
+    numerator = rng.randrange(1, denominator, 2) if denominator > 2 else 1
+    style = rng.randrange(6)
+    if style == 0:
+        return f"{feet}'"
+    if style == 1:
+        return f'{inches}"'
+    if style == 2:
+        return f"{feet}' {inches}\""
+    if style == 3:
+        return f'{numerator}/{denominator}"'
+    if style == 4:
+        return f'{inches} {numerator}/{denominator}"'
+    return f"{feet}' {inches} {numerator}/{denominator}\""
+
+
+def build_corpora(seed: int = 1234, size: int = 200) -> dict:
+    """Build the benchmark corpora: name -> list of expressions"""
+    rng = random.Random(seed)
+    measurement = lambda: _random_measurement(rng)
+
+    short = []
+    for _ in range(size):
+        short.append(f"{measurement()} {rng.choice('+-')} {measurement()}")
+
+    # Long cut lists: 40-80 pieces, some multiplied out
+    long_chains = []
+    for _ in range(size // 10):
+        terms = []
+        for _ in range(rng.randint(40, 80)):
+            term = measurement()
+            if rng.random() < 0.2:
+                term = f"{term} x {rng.randint(2, 12)}"
+            terms.append(term)
+        long_chains.append(' + '.join(terms))
+
+    # Deeply parenthesized expressions
+    nested = []
+    for _ in range(size // 4):
+        expression = measurement()
+        for _ in range(rng.randint(10, 30)):
+            expression = f"({expression} {rng.choice('+-')} {measurement()})"
+            if rng.random() < 0.3:
+                expression = f"{expression} / {rng.randint(2, 4)}"
+        nested.append(expression)
+
+    # Inputs that fail validation or evaluation
+    errors = []
+    bad_forms = ["{a} {b}", "{a} + 1/2", "({a} + {b}", "{a} +", "{a} / 0", "{a} * abc"]
+    for _ in range(size):
+        errors.append(rng.choice(bad_forms).format(a=measurement(), b=rng.randint(1, 99)))
+
+    return {
+        'short': short,
+        'long_chains': long_chains,
+        'nested': nested,
+        'errors': errors,
+        'measurements': [measurement() for _ in range(size)],
+    }
+
+
+def _time_stage(function, inputs: list, repeat: int) -> list:
+    """Call function on every input repeat times and return per-call nanoseconds"""
+    timer = time.perf_counter_ns
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = timer()
+            try:
+                function(item)
+            except ValueError:
+                pass
+            samples.append(timer() - start)
+    return samples
+
+
+def _summarize(samples: list) -> dict:
+    """Reduce nanosecond samples to ops/sec and latency percentiles in microseconds"""
+    ordered = sorted(samples)
+    count = len(ordered)
+    percentile = lambda p: ordered[min(count - 1, int(p * count))] / 1000
+    return {
+        'ops_per_sec': count / (sum(ordered) / 1e9) if sum(ordered) else 0.0,
+        'p50_us': percentile(0.50),
+        'p95_us': percentile(0.95),
+        'p99_us': percentile(0.99),
+        'max_us': ordered[-1] / 1000,
+    }
+
+
+def run_benchmarks(repeat: int = 5, seed: int = 1234) -> dict:
+    """Run every stage over the matching corpora; returns {'corpus/stage': stats}"""
+    corpora = build_corpora(seed)
+    cold = FeetInchesCalculator(cache_size=0)
+    warm = FeetInchesCalculator()
+
+    values = [cold.parse_measurement(text) for text in corpora['measurements']]
+    values += [v * 7.3 for v in values]
+
+    stages = {
+        'measurements/parse': (cold.parse_measurement, corpora['measurements']),
+        'measurements/format': (cold.format_result, values),
+        'measurements/format_rounded': (lambda v: cold.format_result(v, '1/8"'), values),
+    }
+    for corpus in ('short', 'long_chains', 'nested', 'errors'):
+        expressions = corpora[corpus]
+        stages[f'{corpus}/validate'] = (cold.validate_expression, expressions)
+        stages[f'{corpus}/extract'] = (cold._extract_measurements, expressions)
+        stages[f'{corpus}/evaluate'] = (cold.evaluate_expression, expressions)
+        stages[f'{corpus}/evaluate_cached'] = (warm.evaluate_expression, expressions)
+
+    results = {}
+    for name, (function, inputs) in stages.items():
+        _time_stage(function, inputs, 1)  # warm up
+        results[name] = _summarize(_time_stage(function, inputs, repeat))
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float) -> list:
+    """Return descriptions of stages whose ops/sec fell more than threshold below baseline"""
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['ops_per_sec']
+        after = stats['ops_per_sec']
+        if before and after < before * (1 - threshold):
+            regressions.append(f"{name}: {after:,.0f} ops/sec vs baseline {before:,.0f} "
+                               f"({(1 - after / before) * 100:.0f}% slower)")
+    return regressions
+
+
+def print_report(results: dict, baseline: dict = None):
+    """Print a table of results, with the change against baseline when given"""
+    print(f"{'stage':32} {'ops/sec':>12} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'max us':>9}"
+          + ('   vs base' if baseline else ''))
+    for name, stats in results.items():
+        line = (f"{name:32} {stats['ops_per_sec']:12,.0f} {stats['p50_us']:9.1f} "
+                f"{stats['p95_us']:9.1f} {stats['p99_us']:9.1f} {stats['max_us']:9.1f}")
+        if baseline and name in baseline and baseline[name]['ops_per_sec']:
+            change = stats['ops_per_sec'] / baseline[name]['ops_per_sec'] - 1
+            line += f"   {change:+8.0%}"
+        print(line)
+
+
+def main(argv: list = None) -> int:
+    """Run the benchmarks; returns 1 if a regression past the threshold was found"""
+    parser = argparse.ArgumentParser(description='Benchmark the calculator engine hot paths.')
+    parser.add_argument('--repeat', type=int, default=5, help='passes over each corpus (default 5)')
+    parser.add_argument('--baseline', metavar='PATH', help='compare against a saved baseline JSON')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed ops/sec drop before failing, as a fraction (default 0.25)')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = run_benchmarks(args.repeat)
+    print_report(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if baseline:
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nPerformance regressions past {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo performance regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -64,6 +64,28 @@ def run_tests():
         return False
 
 
+def run_benchmarks(baseline='benchmark_baseline.json', threshold=0.25):
+    """Run the benchmarks and fail on regressions against the saved baseline"""
+    if not os.path.exists(baseline):
+        print(f"No {baseline} found, skipping benchmark check.")
+        print(f"Create one with: python benchmark.py --save-baseline {baseline}")
+        return True
+
+    print("Running benchmarks to check for performance regressions...")
+
+    try:
+        result = subprocess.run([sys.executable, 'benchmark.py', '--baseline', baseline,
+                                 '--threshold', str(threshold)],
+                              check=True, capture_output=True, text=True)
+        print("No performance regressions!")
+        return True
+    except subprocess.CalledProcessError as e:
+        print("Performance regressions found!")
+        print(e.stdout)
+        print(e.stderr)
+        return False
+
+
 def install_dependencies():
     """Install required dependencies"""
     
@@ -89,6 +111,11 @@ if __name__ == "__main__":
         print("Please fix the failing tests before building.")
         sys.exit(1)
     
+    # Optionally refuse to build when the engine got slower
+    if '--check-benchmarks' in sys.argv and not run_benchmarks():
+        print("\nBuild aborted: Performance regressions found!")
+        sys.exit(1)
+    
     # Install dependencies
     if not install_dependencies():
         sys.exit(1)
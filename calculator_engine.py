@@ -1,276 +1,2019 @@
+import math
+import mmap
 import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, deque
 from fractions import Fraction
+from itertools import islice
+from math import gcd
+from typing import NamedTuple
+
+# Token kinds produced by FeetInchesCalculator.tokenize()
+MEASURE = 'measure'
+NUMBER = 'number'
+OP = 'op'
+LPAREN = 'lparen'
+RPAREN = 'rparen'
+NAME = 'name'
+
+# Shared measurement grammar: [feet'] [[whole ]num/den" | inches"]
+_FEET = r"(?:(?P<feet>\d+)'\s*)?"
+_INCHES = r"""(?:
+        (?:(?P<whole>\d+)\s+)?(?P<num>\d+)/(?P<den>\d+)"{quote}
+      | (?P<inches>\d+(?:\.\d+)?)"
+    )?"""
+
+# Metric lengths: a number followed by mm, cm or m, e.g. 2440mm or 1.2 m
+_METRIC = r"(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>mm|cm|m)(?![A-Za-z_0-9])"
+
+# Single-pass lexer. Alternatives are tried most specific first; a measurement
+# must contain a feet or inches part and end on a ' or " mark, so a bare number
+# never matches as one.
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<measure>(?=\d)""" + _FEET + _INCHES.format(quote='') + r"""(?(feet)|(?(den)|(?(inches)|(?!))))(?<=['"]))
+      | (?P<metric>""" + _METRIC + r""")
+      | (?P<fraction>\d+/\d+)
+      | (?P<number>\d+(?:\.\d+)?)
+      | (?P<op>[-+*/÷]|[xX](?![A-Za-z_]))
+      | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+      | (?P<lparen>\()
+      | (?P<rparen>\))
+      | (?P<error>\S)
+    )""", re.VERBOSE)
+
+# A single stand-alone measurement, where the trailing " on fractions is optional
+_MEASUREMENT_RE = re.compile(_FEET + _INCHES.format(quote='?'), re.VERBOSE)
+_METRIC_RE = re.compile(_METRIC)
+
+# Millimetres per metric unit; an inch is exactly 25.4 mm, so 1 mm = 5/127 inch
+METRIC_UNITS = {'mm': 1, 'cm': 10, 'm': 1000}
+_INCHES_PER_MM = Fraction(5, 127)
+# Output units accepted by format_result, with the decimal places shown for metric
+OUTPUT_UNITS = ('ft-in', 'mm', 'cm', 'm')
+_METRIC_PLACES = {'mm': 1, 'cm': 2, 'm': 4}
+
+# The same grammar over raw bytes, for scanning memory-mapped files in place
+_MEASUREMENT_BYTES_RE = re.compile(rb"[ \t]*" + (_FEET + _INCHES.format(quote='?')).encode() + rb"[ \t]*", re.VERBOSE)
+
+# Cache keys treat the alternate operator spellings as their canonical form.
+# ÷ gets surrounding spaces so 2÷3" cannot turn into the fraction 2/3".
+_NORMALIZE_TABLE = str.maketrans({'÷': ' / '})
+# An x is only the times operator when it is not part of a name
+_NORMALIZE_X_RE = re.compile(r"(?<![A-Za-z_0-9])[xX](?![A-Za-z_])")
+
+# Rounding spec: an increment such as 1/8" optionally followed by a mode word
+_ROUNDING_RE = re.compile(r"(?P<increment>.*?)\s*(?P<mode>nearest|floor|down|ceil|up)?", re.IGNORECASE)
+_ROUNDING_MODES = {'nearest': 'nearest', 'floor': 'floor', 'down': 'floor', 'ceil': 'ceil', 'up': 'ceil'}
+
+# Stages reported by FeetInchesCalculator.profile_stats(), in pipeline order
+PROFILE_STAGES = ('normalize', 'cache_lookup', 'tokenize', 'compile', 'run', 'format', 'format_many')
+
+# Fraction denominators supported when formatting results
+FORMAT_DENOMINATORS = (8, 16, 32, 64, 128)
+# Fixed grid of Measurement and MeasurementArray: 1/64 inch per tick
+TICKS_PER_INCH = 64
+# Range of a MeasurementArray element, a signed 64-bit array('q') item
+_TICKS_MIN, _TICKS_MAX = -(1 << 63), (1 << 63) - 1
+_INCH_TABLES = {}
+
+_OPERATORS = {'+': '+', '-': '-', '*': '*', 'x': '*', 'X': '*', '/': '/', '÷': '/'}
+_PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2, 'neg': 3}
+_VALID_KINDS = frozenset((MEASURE, NUMBER, OP, LPAREN, RPAREN))
+
+
+class CacheInfo(NamedTuple):
+    """Statistics for the compiled-expression cache"""
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class BatchResult(NamedTuple):
+    """Outcome of one expression in a batch run; value is None when error is set"""
+    expression: str
+    value: float
+    error: str
+
+
+class IngestError(NamedTuple):
+    """A row load_measurements() could not parse; offset is the field's byte offset in the file"""
+    offset: int
+    text: str
+    error: str
+
+
+class Combination(NamedTuple):
+    """Pieces found by find_combinations(); difference is total minus the target"""
+    pieces: tuple
+    total: 'Measurement'
+    difference: 'Measurement'
+
+
+class BatchTotals:
+    """Exact running count, total, min and max of lengths in integer 1/resolution inch ticks.
+
+    With a bucket_width (in ticks) it also keeps a histogram of lengths,
+    bucket i counting lengths in [i * bucket_width, (i + 1) * bucket_width).
+    """
+
+    __slots__ = ('resolution', 'count', 'errors', 'total', 'minimum', 'maximum', 'bucket_width', 'buckets')
+
+    def __init__(self, resolution: int = 64, bucket_width: int = None):
+        if bucket_width is not None and bucket_width < 1:
+            raise ValueError("bucket_width must be a positive number of ticks")
+        self.resolution = resolution
+        self.count = 0
+        self.errors = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self.bucket_width = bucket_width
+        self.buckets = {}
+
+    def add(self, ticks: int):
+        """Add one length in ticks"""
+        self.count += 1
+        self.total += ticks
+        if self.minimum is None or ticks < self.minimum:
+            self.minimum = ticks
+        if self.maximum is None or ticks > self.maximum:
+            self.maximum = ticks
+        if self.bucket_width is not None:
+            bucket = ticks // self.bucket_width
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    @property
+    def mean(self) -> Fraction:
+        """Exact mean length in ticks, or None before anything is added"""
+        return Fraction(self.total, self.count) if self.count else None
+
+    def histogram(self) -> list[tuple[int, int]]:
+        """(bucket start in ticks, count) pairs in length order, skipping empty buckets"""
+        return [(bucket * self.bucket_width, self.buckets[bucket]) for bucket in sorted(self.buckets)]
+
+    def add_error(self):
+        """Count a line that could not be evaluated"""
+        self.errors += 1
+
+
+class _CacheStripe:
+    """One lock-protected shard of the compiled-expression LRU cache"""
+
+    __slots__ = ('lock', 'entries', 'maxsize', 'hits', 'misses', 'evictions')
+
+    def __init__(self, maxsize: int):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+def _gil_enabled() -> bool:
+    """False only on free-threaded CPython builds running without the GIL"""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled() if is_gil_enabled else True
+
+
+class _Name(str):
+    """A template variable in compiled postfix code, resolved at run time"""
+    __slots__ = ()
+
+
+def _is_name(text: str) -> bool:
+    """Whether text can be referenced in an expression: it lexes as one name
+    token (x1 does not, it is x then 1) and is not a metric unit, which would
+    attach to a number before it."""
+    tokens = list(_lex(text)) if isinstance(text, str) else ()
+    return len(tokens) == 1 and tokens[0].kind == NAME and tokens[0].text == text and text not in METRIC_UNITS
+
+
+class Token(NamedTuple):
+    """A lexical token; value is inches for measurements, a float for numbers
+    and the normalized operator symbol for operators. end is where the next
+    token's scan begins."""
+    kind: str
+    text: str
+    value: object
+    start: int
+    end: int
+
+
+def _lex(expression: str, position: int = 0):
+    """Yield raw tokens from position onwards in a single scan.
+
+    Malformed input is yielded as 'fraction', 'zero_fraction' or 'error'
+    tokens rather than raised, so callers can decide how to report it. The
+    tokens from a position depend only on the text after it, which lets
+    IncrementalEvaluator re-scan just an edited span.
+    """
+    for match in _TOKEN_RE.finditer(expression, position):
+        kind = match.lastgroup
+        text = match.group(kind)
+        start = match.start(kind)
+        end = match.end()
+        if kind == MEASURE:
+            if match.group('den') is not None and int(match.group('den')) == 0:
+                yield Token('zero_fraction', text, None, start, end)
+            else:
+                yield Token(MEASURE, text, _measurement_inches(match), start, end)
+        elif kind == 'metric':
+            yield Token(MEASURE, text, _metric_inches(match), start, end)
+        elif kind == NUMBER:
+            yield Token(NUMBER, text, float(text), start, end)
+        elif kind == OP:
+            yield Token(OP, text, _OPERATORS[text], start, end)
+        else:
+            yield Token(kind, text, text, start, end)
+
+
+def _measurement_inches(match) -> float:
+    """Convert a measurement match from the shared grammar to inches"""
+    feet, whole, num, den, inches = match.group('feet', 'whole', 'num', 'den', 'inches')
+    total = int(feet) * 12 if feet else 0
+    if den is not None:
+        if whole:
+            total += int(whole)
+        return total + int(num) / int(den)
+    if inches is not None:
+        return total + float(inches)
+    return float(total)
+
+
+def _metric_inches(match) -> float:
+    """Convert a metric match (amount and unit groups) to inches"""
+    return float(match.group('amount')) * METRIC_UNITS[match.group('unit')] / 25.4
+
+
+def _metric_exact(match) -> Fraction:
+    """Convert a metric match to exact inches"""
+    return Fraction(match.group('amount')) * METRIC_UNITS[match.group('unit')] * _INCHES_PER_MM
+
+
+def _check_denominator(denominator: int) -> int:
+    """Validate a formatting denominator"""
+    if denominator not in FORMAT_DENOMINATORS:
+        raise ValueError(f"Unsupported denominator {denominator}. Use one of {', '.join(map(str, FORMAT_DENOMINATORS))}")
+    return denominator
+
+
+def _check_unit(unit: str) -> str:
+    """Validate an output unit"""
+    if unit not in OUTPUT_UNITS:
+        raise ValueError(f"Unsupported unit '{unit}'. Use one of {', '.join(OUTPUT_UNITS)}")
+    return unit
+
+
+def _metric_string(inches: float, unit: str) -> str:
+    """Format inches in a metric unit, e.g. 2440mm or 1.2192m, without trailing zeros"""
+    places = _METRIC_PLACES[unit]
+    # Exact arithmetic, so halves such as 1/4" = 6.35mm round away from zero instead of
+    # whichever way the binary float of the product happens to fall
+    scaled = _round_fraction(Fraction(inches) * Fraction(127, 5) / METRIC_UNITS[unit] * 10 ** places)
+    digits = str(abs(scaled)).rjust(places + 1, '0')
+    text = f"{digits[:-places]}.{digits[-places:]}".rstrip('0').rstrip('.')
+    return ('-' if scaled < 0 else '') + text + unit
+
+
+def _inch_string(ticks: int, denominator: int) -> str:
+    """Format a positive count of 1/denominator inch as inches with a reduced fraction"""
+    whole, numerator = divmod(ticks, denominator)
+    if not numerator:
+        return f'{whole}"'
+    divisor = gcd(numerator, denominator)
+    fraction = f'{numerator // divisor}/{denominator // divisor}"'
+    return f'{whole} {fraction}' if whole else fraction
+
+
+def _inch_table(denominator: int) -> tuple[str, ...]:
+    """Lookup table from a sub-foot remainder in 1/denominator inch to its inch string.
+
+    Built once per denominator; entry 0 is '' so callers can omit it.
+    """
+    table = _INCH_TABLES.get(denominator)
+    if table is None:
+        entries = [''] + [_inch_string(ticks, denominator) for ticks in range(1, 12 * denominator)]
+        table = _INCH_TABLES[denominator] = tuple(entries)
+    return table
+
+
+def _measurement_exact(match) -> Fraction:
+    """Convert a measurement match from the shared grammar to exact inches"""
+    feet, whole, num, den, inches = match.group('feet', 'whole', 'num', 'den', 'inches')
+    total = int(feet) * 12 if feet else 0
+    if den is not None:
+        return total + int(whole or 0) + Fraction(int(num), int(den))
+    if inches is not None:
+        return total + Fraction(inches)
+    return Fraction(total)
+
+
+def _parse_exact(text: str) -> Fraction:
+    """Parse a measurement in parse_measurement syntax to exact inches"""
+    text = text.strip()
+    match = _MEASUREMENT_RE.fullmatch(text)
+    if match and match.end() > 0:
+        if match.group('den') is not None and int(match.group('den')) == 0:
+            raise ValueError(f"Unable to parse measurement: {text}")
+        return _measurement_exact(match)
+    match = _METRIC_RE.fullmatch(text)
+    if match:
+        return _metric_exact(match)
+    try:
+        return Fraction(text)
+    except ValueError:
+        raise ValueError(f"Unable to parse measurement: {text}")
+
+
+def _format_ticks(ticks: int, resolution: int) -> str:
+    """Format an integer count of 1/resolution inch as feet and inches using integer math only"""
+    if ticks == 0:
+        return '0"'
+    feet, remainder = divmod(abs(ticks), 12 * resolution)
+    sign = '-' if ticks < 0 else ''
+    if not remainder:
+        return f"{sign}{feet}'"
+    # Only tabulate the usual denominators; odd resolutions are formatted directly
+    if resolution in FORMAT_DENOMINATORS:
+        inches = _inch_table(resolution)[remainder]
+    else:
+        inches = _inch_string(remainder, resolution)
+    return f"{sign}{feet}' {inches}" if feet else sign + inches
+
+
+def _round_fraction(value: Fraction) -> int:
+    """Round to the nearest integer, ties away from zero"""
+    numerator, denominator = value.numerator, value.denominator
+    if numerator < 0:
+        return -((-2 * numerator + denominator) // (2 * denominator))
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+class RoundingSpec:
+    """A rounding increment compiled once, e.g. 1/8" to the nearest, floor or ceil"""
+
+    __slots__ = ('text', 'increment', 'exact_increment', 'mode', '_inverse')
+
+    def __init__(self, increment, mode: str = 'nearest', text: str = None):
+        if mode not in ('nearest', 'floor', 'ceil'):
+            raise ValueError(f"Unknown rounding mode '{mode}'. Use nearest, floor or ceil")
+        self.exact_increment = Fraction(increment)
+        if self.exact_increment <= 0:
+            raise ValueError("Rounding increment must be greater than zero")
+        self.increment = float(self.exact_increment)
+        self.mode = mode
+        self.text = text if text is not None else f'{increment}"'
+        self._inverse = 1 / self.increment
+
+    @classmethod
+    def parse(cls, text: str, mode: str = None) -> 'RoundingSpec':
+        """Compile a spec such as '1/8"', '1"' or '1/16" up'"""
+        match = _ROUNDING_RE.fullmatch(text.strip())
+        increment_match = _MEASUREMENT_RE.fullmatch(match.group('increment'))
+        if increment_match and increment_match.end() > 0 and int(increment_match.group('den') or 1) != 0:
+            increment = _measurement_exact(increment_match)
+        else:
+            # Metric increments such as 1mm or 0.5cm
+            increment_match = _METRIC_RE.fullmatch(match.group('increment'))
+            if not increment_match:
+                raise ValueError(f"Invalid rounding value '{text.strip()}'. Example: 1/8\"")
+            increment = _metric_exact(increment_match)
+        if mode is None:
+            mode = _ROUNDING_MODES[(match.group('mode') or 'nearest').lower()]
+        return cls(increment, mode, text.strip())
+
+    def apply(self, inches: float) -> float:
+        """Round a value in inches to a multiple of the increment"""
+        steps = inches * self._inverse
+        nearest = round(steps)
+        # Treat float noise just off a whole step as landing on it
+        if abs(steps - nearest) < 1e-9:
+            steps = nearest
+        elif self.mode == 'floor':
+            steps = math.floor(steps)
+        elif self.mode == 'ceil':
+            steps = math.ceil(steps)
+        else:
+            steps = math.floor(abs(steps) + 0.5) * (1 if steps >= 0 else -1)
+        return steps * self.increment
+
+    def apply_ticks(self, ticks: int, resolution: int) -> int:
+        """Round an integer count of 1/resolution inch, staying exact"""
+        steps = Fraction(ticks) / (self.exact_increment * resolution)
+        if self.mode == 'floor':
+            steps = math.floor(steps)
+        elif self.mode == 'ceil':
+            steps = math.ceil(steps)
+        else:
+            steps = _round_fraction(steps)
+        return _round_fraction(steps * self.exact_increment * resolution)
+
+    def __repr__(self):
+        return f"RoundingSpec({self.text!r}, mode={self.mode!r})"
+
+
+def _to_ticks(value) -> int:
+    """Convert a Measurement, measurement string or number of inches to 1/64" ticks"""
+    if isinstance(value, Measurement):
+        return value.ticks
+    if isinstance(value, str):
+        value = _parse_exact(value)
+    elif isinstance(value, float):
+        value = Fraction(value)
+    return _round_fraction(value * TICKS_PER_INCH)
+
+
+class Measurement:
+    """An immutable length held as an integer count of 1/64 inch.
+
+    Built from a measurement string, a number of inches or another
+    Measurement. Adding, subtracting and scaling give Measurements; dividing
+    one Measurement by another gives a plain ratio. Results snap to the
+    nearest 1/64", ties away from zero.
+    """
+
+    __slots__ = ('_ticks',)
+
+    def __init__(self, value=0):
+        object.__setattr__(self, '_ticks', _to_ticks(value))
+
+    @classmethod
+    def from_ticks(cls, ticks: int) -> 'Measurement':
+        """Wrap an integer count of 1/64 inch without any parsing"""
+        measurement = object.__new__(cls)
+        object.__setattr__(measurement, '_ticks', int(ticks))
+        return measurement
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Measurement is immutable")
+
+    __delattr__ = __setattr__
+
+    @property
+    def ticks(self) -> int:
+        return self._ticks
+
+    @property
+    def inches(self) -> float:
+        return self._ticks / TICKS_PER_INCH
+
+    @property
+    def exact(self) -> Fraction:
+        return Fraction(self._ticks, TICKS_PER_INCH)
+
+    def __add__(self, other):
+        if isinstance(other, Measurement):
+            return Measurement.from_ticks(self._ticks + other._ticks)
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Measurement):
+            return Measurement.from_ticks(self._ticks - other._ticks)
+        return NotImplemented
+
+    def __mul__(self, factor):
+        if isinstance(factor, int):
+            return Measurement.from_ticks(self._ticks * factor)
+        if isinstance(factor, (float, Fraction)):
+            return Measurement.from_ticks(_round_fraction(self._ticks * Fraction(factor)))
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, Measurement):
+            if not other._ticks:
+                raise ZeroDivisionError("division by a zero length")
+            return self._ticks / other._ticks
+        if isinstance(other, (int, float, Fraction)):
+            if not other:
+                raise ZeroDivisionError("division by zero")
+            return Measurement.from_ticks(_round_fraction(Fraction(self._ticks) / Fraction(other)))
+        return NotImplemented
+
+    def __neg__(self):
+        return Measurement.from_ticks(-self._ticks)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return Measurement.from_ticks(abs(self._ticks))
+
+    def __bool__(self):
+        return self._ticks != 0
+
+    def __float__(self):
+        return self._ticks / TICKS_PER_INCH
+
+    def __eq__(self, other):
+        if isinstance(other, Measurement):
+            return self._ticks == other._ticks
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Measurement):
+            return self._ticks < other._ticks
+        return NotImplemented
+
+    def __le__(self, other):
+        if isinstance(other, Measurement):
+            return self._ticks <= other._ticks
+        return NotImplemented
+
+    def __gt__(self, other):
+        if isinstance(other, Measurement):
+            return self._ticks > other._ticks
+        return NotImplemented
+
+    def __ge__(self, other):
+        if isinstance(other, Measurement):
+            return self._ticks >= other._ticks
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._ticks)
+
+    def __reduce__(self):
+        return Measurement.from_ticks, (self._ticks,)
+
+    def __str__(self):
+        return _format_ticks(self._ticks, TICKS_PER_INCH)
+
+    def __repr__(self):
+        return f"Measurement({str(self)!r})"
+
+
+class MeasurementArray:
+    """A compact sequence of lengths stored as signed 64-bit 1/64 inch ticks.
+
+    Items are only boxed into Measurement objects when indexed or iterated;
+    sum, min, max, sort and slicing work on the packed integers.
+    """
+
+    __slots__ = ('_ticks',)
+
+    def __init__(self, values=()):
+        self._ticks = array('q', map(_to_ticks, values))
+
+    @classmethod
+    def from_ticks(cls, ticks) -> 'MeasurementArray':
+        """Build from an iterable (or array('q')) of 1/64 inch ticks; an array('q') is copied"""
+        measurements = object.__new__(cls)
+        measurements._ticks = array('q', ticks)
+        return measurements
+
+    @property
+    def ticks(self) -> array:
+        """The underlying array('q'); edits show through to this MeasurementArray"""
+        return self._ticks
+
+    def append(self, value):
+        self._ticks.append(_to_ticks(value))
+
+    def extend(self, values):
+        self._ticks.extend(map(_to_ticks, values))
+
+    def __len__(self):
+        return len(self._ticks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return MeasurementArray.from_ticks(self._ticks[index])
+        return Measurement.from_ticks(self._ticks[index])
+
+    def __iter__(self):
+        return map(Measurement.from_ticks, self._ticks)
+
+    def __eq__(self, other):
+        if isinstance(other, MeasurementArray):
+            return self._ticks == other._ticks
+        return NotImplemented
+
+    def sum(self) -> Measurement:
+        """Exact total"""
+        return Measurement.from_ticks(sum(self._ticks))
+
+    def min(self) -> Measurement:
+        return Measurement.from_ticks(min(self._ticks))
+
+    def max(self) -> Measurement:
+        return Measurement.from_ticks(max(self._ticks))
+
+    def sort(self, reverse: bool = False):
+        """Sort in place.
+
+        With NumPy the tick buffer is sorted where it lies, without a copy;
+        otherwise the ticks are sorted into a new array.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            self._ticks = array('q', sorted(self._ticks, reverse=reverse))
+            return
+        np.frombuffer(self._ticks, dtype=np.int64).sort()
+        if reverse:
+            self._ticks.reverse()
+
+    def inches(self) -> list[float]:
+        """Every length as float inches, e.g. to pass to format_many"""
+        return [ticks / TICKS_PER_INCH for ticks in self._ticks]
+
+    def __repr__(self):
+        shown = ', '.join(str(Measurement.from_ticks(ticks)) for ticks in self._ticks[:5])
+        more = f', ... {len(self._ticks)} items' if len(self._ticks) > 5 else ''
+        return f"MeasurementArray([{shown}{more}])"
+
+
+def _row_pattern(column: int, delimiter: bytes):
+    """Regex matching one line and capturing the chosen field.
+
+    With a column, fields may be double-quoted with "" for a literal quote,
+    as CSV writers do for inch marks; group 1 is the field and group 2 is
+    the whole line when it has too few columns. Without one, the single
+    group is the whole line.
+    """
+    if column is None:
+        return re.compile(rb"^([^\r\n]*)\r?$", re.MULTILINE)
+    separator = re.escape(delimiter)
+    field = rb'(?:[ \t]*"(?:[^"]|"")*"[ \t]*|[^' + separator + rb'\r\n]*)'
+    return re.compile(rb"^(?:" + field + separator + rb"){%d}(" % column + field
+                      + rb")(?:" + separator + rb"[^\r\n]*)?\r?$|^([^\r\n]*)", re.MULTILINE)
+
+
+def _bytes_measurement_ticks(match) -> int:
+    """Convert a _MEASUREMENT_BYTES_RE match to 1/64 inch ticks with integer math only"""
+    feet, whole, num, den, inches = match.group('feet', 'whole', 'num', 'den', 'inches')
+    ticks = int(feet) * 12 * TICKS_PER_INCH if feet else 0
+    if den is not None:
+        # Non-negative, so rounding half up is the same as ties away from zero
+        numerator, denominator = (int(whole or 0) * int(den) + int(num)) * TICKS_PER_INCH, int(den)
+    elif inches is not None:
+        integer, _, decimals = inches.partition(b'.')
+        denominator = 10 ** len(decimals)
+        numerator = (int(integer) * denominator + int(decimals or 0)) * TICKS_PER_INCH
+    else:
+        return ticks
+    return ticks + (2 * numerator + denominator) // (2 * denominator)
+
+
+def _field_ticks(field: bytes):
+    """Ticks for one raw field, '' for a blank field, or None if it is not a measurement
+    or too long for a MeasurementArray"""
+    match = _MEASUREMENT_BYTES_RE.fullmatch(field)
+    if match is None and b'"' in field:
+        # Quoted CSV field: unquote it before matching
+        field = field.strip()
+        if field[:1] == b'"' and field[-1:] == b'"':
+            field = field[1:-1].replace(b'""', b'"')
+            match = _MEASUREMENT_BYTES_RE.fullmatch(field)
+    if match is not None:
+        feet, den, inches = match.group('feet', 'den', 'inches')
+        # A blank field matches with no parts; a zero denominator is an error
+        if (feet or den or inches) is None:
+            return ''
+        if den is not None and not int(den):
+            return None
+        ticks = _bytes_measurement_ticks(match)
+    else:
+        try:
+            # Plain numbers of inches and metric lengths, as parse_measurement accepts
+            ticks = _to_ticks(_parse_exact(field.decode('ascii')))
+        except (ValueError, UnicodeDecodeError, ZeroDivisionError):
+            return None
+    return ticks if _TICKS_MIN <= ticks <= _TICKS_MAX else None
+
+
+class _FieldTicks(dict):
+    """Memo from a row as returned by findall() to its ticks, None for blank or bad rows"""
+
+    def __missing__(self, row):
+        if isinstance(row, tuple):
+            field, short = row
+            value = _field_ticks(field) if not short else (None if short.strip() else '')
+        else:
+            value = _field_ticks(row)
+        if len(self) >= 65536:
+            self.clear()
+        self[row] = value = None if value == '' else value
+        return value
+
+
+def load_measurements(path: str, column=None, delimiter: str = ',', header: bool = False,
+                      chunk_size: int = 1 << 20):
+    """Load one column of measurements from a CSV or newline-delimited file.
+
+    The file is memory-mapped and scanned in place a chunk at a time with
+    byte regexes, so rows are never decoded to str. Each distinct field is
+    parsed once; repeats are a dict lookup. Values go straight into a
+    MeasurementArray of 1/64" ticks. column is a zero-based index, or a
+    name looked up in the header row (which implies header=True); None reads
+    whole lines. Blank fields are skipped. Returns (measurements, errors)
+    where errors lists an IngestError for each field that is not a
+    measurement or plain number.
+    """
+    if isinstance(column, str):
+        header = True
+    ticks = array('q')
+    errors = []
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return MeasurementArray.from_ticks(ticks), errors
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            size = len(buffer)
+            position = 0
+            if header:
+                position = buffer.find(b'\n') + 1 or size
+                if isinstance(column, str):
+                    import csv
+                    names = next(csv.reader([buffer[:position].decode('utf-8-sig')], delimiter=delimiter), [])
+                    names = [name.strip() for name in names]
+                    if column not in names:
+                        raise ValueError(f"Column '{column}' not found in header of {path}")
+                    column = names.index(column)
+
+            pattern = _row_pattern(column, delimiter.encode())
+            memo = _FieldTicks()
+            lookup = memo.__getitem__
+            while position < size:
+                # Chunks stop just before a newline so no row is split and
+                # no empty line is seen after the chunk's last newline
+                end = buffer.find(b'\n', position + chunk_size)
+                if end < 0:
+                    end = size - 1 if buffer[-1:] == b'\n' else size
+                values = list(map(lookup, pattern.findall(buffer, position, end)))
+                if None not in values:
+                    ticks.extend(values)
+                else:
+                    # Rare path: rescan this chunk to skip blanks and locate bad rows
+                    for line in pattern.finditer(buffer, position, end):
+                        value = lookup(line.groups(b'') if line.re.groups > 1 else line.group(1))
+                        if value is not None:
+                            ticks.append(value)
+                            continue
+                        group = 1 if line.start(1) >= 0 else 2
+                        text = line.group(group).decode('utf-8', 'replace').strip()
+                        if text:
+                            error = f"Row has no column {column}" if group == 2 else f"Unable to parse measurement: {text}"
+                            errors.append(IngestError(line.start(group), text, error))
+                position = end + 1
+    return MeasurementArray.from_ticks(ticks), errors
+
 
 class FeetInchesCalculator:
-    def __init__(self):
-        pass
+    """Parses, evaluates and formats feet and inches expressions.
+
+    An instance is reentrant and safe to share between threads: evaluation
+    keeps its state on the stack, the compiled-expression cache is split into
+    lock-protected stripes so threads rarely wait on each other, and the
+    rounding-spec cache only ever adds complete entries. Share one warm
+    instance per process rather than building one per thread.
+    IncrementalEvaluator and BatchTotals are per-caller and not shared.
+    """
+
+    def __init__(self, cache_size: int = 1024, exact: bool = False, resolution: int = 64,
+                 denominator: int = 64, cache_stripes: int = 16, unit: str = 'ft-in', result_cache=None):
+        # In exact mode lengths are integer counts of 1/resolution inch ("ticks")
+        if resolution < 1:
+            raise ValueError("resolution must be a positive integer")
+        self.exact = exact
+        self.resolution = resolution
+        self.denominator = _check_denominator(denominator)
+        self.unit = _check_unit(unit)
+        self._rounding_specs = {}
+
+        # Per-stage [calls, total_ns, max_ns] while profiling is enabled, else None
+        self._profile = None
+        self._profile_lock = threading.Lock()
+
+        # LRU cache of normalized expression -> compiled postfix code, split by
+        # key hash into a power-of-two number of stripes of at least 64 entries
+        # (small caches keep one stripe so LRU order stays exact)
+        self.cache_size = cache_size
+        stripes = 1
+        while stripes * 2 <= min(cache_stripes, cache_size // 64):
+            stripes *= 2
+        self._stripe_mask = stripes - 1
+        self._stripes = tuple(_CacheStripe(-(-cache_size // stripes)) for _ in range(stripes))
+
+        # Optional persistent cache of results shared across sessions and
+        # processes: a result_cache.ResultCache, or a path to open one at
+        if isinstance(result_cache, str):
+            from result_cache import ResultCache
+            result_cache = ResultCache(result_cache)
+        self.result_cache = result_cache
+        self._result_mode = f"{int(exact)}|{resolution}"
 
     def parse_measurement(self, text: str) -> float:
         """Parse a measurement string and return total inches as float"""
         text = text.strip()
-        
-        # Check for feet with mixed number inches (e.g., "1' 2 3/4"")
-        match = re.match(r"(\d+)'\s*(\d+)\s+(\d+)/(\d+)\"", text)
-        if match:
-            feet = int(match.group(1))
-            whole_inches = int(match.group(2))
-            numerator = int(match.group(3))
-            denominator = int(match.group(4))
-            fraction_inches = float(Fraction(numerator, denominator))
-            return feet * 12 + whole_inches + fraction_inches
-        
-        # Check for feet with pure fraction inches (e.g., "1' 11/32"")
-        match = re.match(r"(\d+)'\s*(\d+)/(\d+)\"", text)
-        if match:
-            feet = int(match.group(1))
-            numerator = int(match.group(2))
-            denominator = int(match.group(3))
-            fraction_inches = float(Fraction(numerator, denominator))
-            return feet * 12 + fraction_inches
-        
-        # Check for feet and inches (e.g., "1' 11"")
-        match = re.match(r"(\d+)'\s*(\d+(?:\.\d+)?)\"", text)
-        if match:
-            feet = int(match.group(1))
-            inches = float(match.group(2))
-            return feet * 12 + inches
-        
-        # Check for feet only (e.g., "1'")
-        match = re.match(r"(\d+)'$", text)
-        if match:
-            feet = int(match.group(1))
-            return feet * 12
-        
-        # Check for mixed number inches without feet (e.g., "0 1/2"" or "2 3/4"")
-        match = re.match(r"^(\d+)\s+(\d+)/(\d+)\"?$", text)
-        if match:
-            whole_inches = int(match.group(1))
-            numerator = int(match.group(2))
-            denominator = int(match.group(3))
-            fraction_inches = float(Fraction(numerator, denominator))
-            return whole_inches + fraction_inches
-        
-        # Check for pure fractions (e.g., "1/32"" or "1/32")
-        match = re.match(r"^(\d+)/(\d+)\"?$", text)
-        if match:
-            numerator = int(match.group(1))
-            denominator = int(match.group(2))
-            return float(Fraction(numerator, denominator))
-        
-        # Check for inches only (e.g., "11.5"")
-        match = re.match(r"^(\d+(?:\.\d+)?)\"$", text)
+
+        match = _MEASUREMENT_RE.fullmatch(text)
+        if match and match.end() > 0:
+            if match.group('den') is not None and int(match.group('den')) == 0:
+                raise ValueError(f"Unable to parse measurement: {text}")
+            return _measurement_inches(match)
+
+        match = _METRIC_RE.fullmatch(text)
         if match:
-            return float(match.group(1))
-          # Plain number
+            return _metric_inches(match)
+
+        # Plain number
         try:
             return float(text)
         except ValueError:
             raise ValueError(f"Unable to parse measurement: {text}")
 
-    def format_result(self, total_inches: float, round_to: str = None) -> str:
-        """Format total inches back to feet and inches with fractions"""
-        # Handle negative values properly
-        is_negative = total_inches < 0
-        abs_inches = abs(total_inches)
-        
-        feet = int(abs_inches // 12)
-        remaining_inches = abs_inches % 12
-        
-        if remaining_inches == 0:
-            if feet == 0:
-                return '0"'
-            result = f"{feet}'"
-            return f"-{result}" if is_negative else result
-        
-        # Convert decimal inches to fraction
-        inches_fraction = Fraction(remaining_inches).limit_denominator(64)
-        
-        result_parts = []
-        if feet > 0:
-            result_parts.append(f"{feet}'")        
-        whole_part = inches_fraction.numerator // inches_fraction.denominator
-        remainder = inches_fraction.numerator % inches_fraction.denominator
-        
-        if remainder == 0:
-            if whole_part > 0:
-                result_parts.append(f'{whole_part}"')
-        else:
-            if whole_part > 0:
-                result_parts.append(f'{whole_part} {remainder}/{inches_fraction.denominator}"')
+    def format_result(self, total_inches: float, round_to=None, denominator: int = None, unit: str = None) -> str:
+        """Format total inches back to feet and inches with fractions, or in mm, cm or m"""
+        if self._profile is not None:
+            start = time.perf_counter_ns()
+            try:
+                return self._format_result(total_inches, round_to, denominator, unit)
+            finally:
+                self._record('format', time.perf_counter_ns() - start)
+        return self._format_result(total_inches, round_to, denominator, unit)
+
+    def _format_result(self, total_inches: float, round_to, denominator: int, unit: str = None) -> str:
+        """Format a single value; see format_result"""
+        rounding = self.compile_rounding(round_to)
+        if rounding is not None:
+            total_inches = rounding.apply(total_inches)
+        unit = self.unit if unit is None else _check_unit(unit)
+        if unit != 'ft-in':
+            return _metric_string(total_inches, unit)
+
+        denominator = self._format_denominator(denominator)
+        table = _inch_table(denominator)
+        per_foot = 12 * denominator
+
+        # Snap to the nearest 1/denominator inch, halves away from zero
+        ticks = int(abs(total_inches) * denominator + 0.5)
+        if ticks == 0:
+            return '0"'
+        feet, remainder = divmod(ticks, per_foot)
+        sign = '-' if total_inches < 0 else ''
+        if not feet:
+            return sign + table[remainder]
+        if not remainder:
+            return f"{sign}{feet}'"
+        return f"{sign}{feet}' {table[remainder]}"
+
+    def format_many(self, values, round_to=None, denominator: int = None, unit: str = None) -> list[str]:
+        """Format a sequence of inch totals, sharing one lookup table for the whole batch"""
+        if self._profile is not None:
+            start = time.perf_counter_ns()
+            try:
+                return self._format_many(values, round_to, denominator, unit)
+            finally:
+                self._record('format_many', time.perf_counter_ns() - start)
+        return self._format_many(values, round_to, denominator, unit)
+
+    def _format_many(self, values, round_to, denominator: int, unit: str = None) -> list[str]:
+        """Format a batch of values; see format_many"""
+        rounding = self.compile_rounding(round_to)
+        round_value = rounding.apply if rounding is not None else None
+        unit = self.unit if unit is None else _check_unit(unit)
+        if unit != 'ft-in':
+            if round_value is not None:
+                values = map(round_value, values)
+            return [_metric_string(total_inches, unit) for total_inches in values]
+
+        denominator = self._format_denominator(denominator)
+        table = _inch_table(denominator)
+        per_foot = 12 * denominator
+
+        results = []
+        append = results.append
+        for total_inches in values:
+            if round_value is not None:
+                total_inches = round_value(total_inches)
+            ticks = int(abs(total_inches) * denominator + 0.5)
+            if ticks == 0:
+                append('0"')
+                continue
+            feet, remainder = divmod(ticks, per_foot)
+            sign = '-' if total_inches < 0 else ''
+            if not feet:
+                append(sign + table[remainder])
+            elif not remainder:
+                append(f"{sign}{feet}'")
             else:
-                result_parts.append(f'{remainder}/{inches_fraction.denominator}"')
-        
-        result = ' '.join(result_parts) if result_parts else '0"'
-        return f"-{result}" if is_negative else result
+                append(f"{sign}{feet}' {table[remainder]}")
+        return results
+
+    def compile_rounding(self, round_to, mode: str = None) -> RoundingSpec:
+        """Return a compiled RoundingSpec for a spec string, reusing earlier compilations.
+
+        None or a blank string means no rounding and returns None.
+        """
+        if round_to is None or isinstance(round_to, RoundingSpec):
+            return round_to
+        if not round_to.strip():
+            return None
+        key = (round_to, mode)
+        spec = self._rounding_specs.get(key)
+        if spec is None:
+            spec = RoundingSpec.parse(round_to, mode)
+            if len(self._rounding_specs) >= 256:
+                self._rounding_specs.clear()
+            self._rounding_specs[key] = spec
+        return spec
+
+    def _format_denominator(self, denominator: int = None) -> int:
+        """Resolve the fraction denominator used for formatting"""
+        return self.denominator if denominator is None else _check_denominator(denominator)
+
+    def tokenize(self, expression: str) -> list[Token]:
+        """Split an expression into typed tokens in a single scan"""
+        tokens, error_msg = self._scan(expression)
+        if error_msg:
+            raise ValueError(f"Format Error: {error_msg}")
+        return tokens
 
     def validate_expression(self, expression: str) -> tuple[bool, str]:
         """Validate expression format and return (is_valid, error_message)"""
-        # Create a copy to work with
-        temp_expr = expression
-        
-        # First, temporarily replace valid patterns to avoid false positives
-        # Replace mixed fractions (0 1/2", 2 3/4", etc.)
-        temp_expr = re.sub(r'\b\d+\s+\d+/\d+\"', ' VALID_MIXED ', temp_expr)
-        
-        # Replace feet with mixed fractions (1' 2 3/4")
-        temp_expr = re.sub(r'\b\d+\'\s*\d+\s+\d+/\d+\"', ' VALID_FEET_MIXED ', temp_expr)
-        
-        # Replace feet with fractions (1' 3/4")
-        temp_expr = re.sub(r'\b\d+\'\s*\d+/\d+\"', ' VALID_FEET_FRAC ', temp_expr)
-        
-        # Replace feet with inches (1' 11")
-        temp_expr = re.sub(r'\b\d+\'\s*\d+\"', ' VALID_FEET_INCH ', temp_expr)
-        
-        # Replace feet only (1')
-        temp_expr = re.sub(r'\b\d+\'', ' VALID_FEET ', temp_expr)
-        
-        # Replace pure fractions (1/2")
-        temp_expr = re.sub(r'\b\d+/\d+\"', ' VALID_FRAC ', temp_expr)
-        
-        # Replace inches only (11")
-        temp_expr = re.sub(r'\b\d+\"', ' VALID_INCH ', temp_expr)
-        
-        # Replace decimal numbers and integers that are used in mathematical operations
-        # These are valid when used for multiplication, division, or as operands
-        temp_expr = re.sub(r'[\*/]\s*\d+(?:\.\d+)?\b', ' * VALID_NUMBER ', temp_expr)
-        temp_expr = re.sub(r'\b\d+(?:\.\d+)?\s*[\*/]', ' VALID_NUMBER * ', temp_expr)
-        temp_expr = re.sub(r'[\+\-]\s*\d+(?:\.\d+)?\s*[\*/]', ' + VALID_NUMBER * ', temp_expr)
-        temp_expr = re.sub(r'[\*/]\s*\d+(?:\.\d+)?\s*[\+\-]', ' * VALID_NUMBER + ', temp_expr)
-        
-        # Now check for problematic patterns in the cleaned expression
-        
-        # Check for numbers without any unit designation that are NOT part of valid operations
-        number_without_unit = re.search(r'\b\d+\b(?!\s*[\'\"\/])', temp_expr)
-        if number_without_unit:
-            number = number_without_unit.group()
-            # Only flag this as an error if it's not "VALID_NUMBER" (our placeholder)
-            if number != "VALID_NUMBER":
-                return False, f"Found number '{number}' without feet (') or inches (\") designation. Example: 10' 2 1/2\""
-        
-        # Check for fractions without quotes in the original expression
-        # But first exclude cases where the fraction is already part of a valid pattern
-        temp_check = expression
-        
-        # Remove all valid quoted fractions first
-        temp_check = re.sub(r'\d+/\d+\"', '', temp_check)
-        
-        # Now look for any remaining fractions without quotes
-        fraction_without_quote = re.search(r'\b\d+/\d+\b', temp_check)
-        if fraction_without_quote:
-            fraction = fraction_without_quote.group()
-            return False, f"Found fraction '{fraction}' without inches (\") designation. Example: {fraction}\""
-        
-        return True, ""
+        _, error_msg = self._scan(expression)
+        return (False, error_msg) if error_msg else (True, "")
 
     def evaluate_expression(self, expression: str) -> float:
         """Evaluate a mathematical expression with feet and inches measurements"""
-        expression = expression.strip()
-        
-        # First validate the expression format
-        is_valid, error_msg = self.validate_expression(expression)
-        if not is_valid:
+        if self.result_cache is not None:
+            return self._evaluate_cached(expression, ticks=False)
+        if self._profile is not None:
+            return self._evaluate_profiled(expression, ticks=False)
+        code = self.compile_expression(expression)
+        if self.exact:
+            return self._run_exact(code) / self.resolution
+        return float(self._run(code))
+
+    def evaluate_ticks(self, expression: str) -> int:
+        """Evaluate an expression to an integer count of 1/resolution inch"""
+        if self.result_cache is not None:
+            return self._evaluate_cached(expression, ticks=True)
+        if self._profile is not None:
+            return self._evaluate_profiled(expression, ticks=True)
+        code = self.compile_expression(expression)
+        if self.exact:
+            return self._run_exact(code)
+        return self.to_ticks(self._run(code))
+
+    def solve(self, expression: str, round_to=None, denominator: int = None, unit: str = None) -> tuple[float, str]:
+        """Evaluate and format an expression, returning (inches, result).
+
+        With a result cache the pair is stored as one entry under the
+        expression and the formatting options, so a repeat costs one lookup.
+        """
+        cache = self.result_cache
+        if cache is None:
+            inches = self.evaluate_expression(expression)
+            return inches, self.format_result(inches, round_to, denominator, unit)
+
+        rounding = self.compile_rounding(round_to)
+        denominator = self._format_denominator(denominator)
+        unit = self.unit if unit is None else _check_unit(unit)
+        spec = '' if rounding is None else f"{rounding.exact_increment}:{rounding.mode}"
+        key = f"s|{self._result_mode}|{spec}|{denominator}|{unit}|{self.normalize_expression(expression)}"
+        hit = cache.get(key)
+        if hit is not None:
+            inches, result, error = hit
+            if error is not None:
+                raise ValueError(error)
+            return inches, result
+        try:
+            inches = self._evaluate_uncached(expression, ticks=False)
+        except ValueError as e:
+            cache.put(key, error=str(e))
+            raise
+        result = self.format_result(inches, rounding, denominator, unit)
+        cache.put(key, inches, result)
+        return inches, result
+
+    def _evaluate_cached(self, expression: str, ticks: bool):
+        """evaluate_expression / evaluate_ticks through the persistent result cache.
+
+        Errors are cached too, since they depend only on the expression.
+        """
+        cache = self.result_cache
+        key = f"{'t' if ticks else 'e'}|{self._result_mode}|{self.normalize_expression(expression)}"
+        hit = cache.get(key)
+        if hit is not None:
+            if hit[2] is not None:
+                raise ValueError(hit[2])
+            return hit[0]
+        try:
+            value = self._evaluate_uncached(expression, ticks)
+        except ValueError as e:
+            cache.put(key, error=str(e))
+            raise
+        cache.put(key, value)
+        return value
+
+    def _evaluate_uncached(self, expression: str, ticks: bool):
+        """Evaluate without consulting the result cache"""
+        if self._profile is not None:
+            return self._evaluate_profiled(expression, ticks)
+        code = self.compile_expression(expression)
+        if self.exact:
+            result = self._run_exact(code)
+            return result if ticks else result / self.resolution
+        result = self._run(code)
+        return self.to_ticks(result) if ticks else float(result)
+
+    def evaluate_lines(self, lines, totals: BatchTotals = None):
+        """Evaluate one expression per line, yielding a BatchResult for each non-blank line.
+
+        When totals is given each result is added to it in exact integer
+        ticks, so a grand total never accumulates float error.
+        """
+        if totals is not None and totals.resolution != self.resolution:
+            raise ValueError("totals must use the calculator's resolution")
+        for line in lines:
+            expression = line.strip()
+            if not expression:
+                continue
+            try:
+                ticks = self.evaluate_ticks(expression)
+            except ValueError as e:
+                if totals is not None:
+                    totals.add_error()
+                yield BatchResult(expression, None, str(e))
+                continue
+            if totals is not None:
+                totals.add(ticks)
+            yield BatchResult(expression, ticks / self.resolution, None)
+
+    def aggregate(self, values, bucket_width=None, totals: BatchTotals = None) -> BatchTotals:
+        """Reduce measurements or expressions to exact totals in one pass and constant memory.
+
+        values may mix measurement strings (as parse_measurement accepts
+        them), expressions, Measurements and numbers of inches; blank strings
+        are skipped and ones that fail are counted as errors. bucket_width (e.g. '6"') adds a length histogram.
+        Sums are kept in integer 1/resolution inch ticks, so they never drift.
+        """
+        if totals is None:
+            if bucket_width is not None:
+                bucket_width = self._length_ticks(bucket_width)
+            totals = BatchTotals(self.resolution, bucket_width)
+        elif totals.resolution != self.resolution:
+            raise ValueError("totals must use the calculator's resolution")
+        add = totals.add
+        evaluate_ticks = self.evaluate_ticks
+        # Plain measurements at 1/64" skip the expression engine, as in load_measurements
+        plain = _MEASUREMENT_BYTES_RE.fullmatch if self.resolution == TICKS_PER_INCH else None
+        for value in values:
+            if isinstance(value, str):
+                match = plain(value.encode()) if plain is not None else None
+                if match is not None:
+                    feet, den, inches = match.group('feet', 'den', 'inches')
+                    if (feet or den or inches) is None:
+                        continue
+                    if den is None or int(den):
+                        add(_bytes_measurement_ticks(match))
+                    else:
+                        totals.add_error()
+                    continue
+                if not value.strip():
+                    continue
+                try:
+                    # Plain numbers of inches and metric lengths, as parse_measurement reads them
+                    ticks = self._length_ticks(value)
+                except (ValueError, ZeroDivisionError):
+                    try:
+                        ticks = evaluate_ticks(value)
+                    except ValueError:
+                        totals.add_error()
+                        continue
+                add(ticks)
+            else:
+                add(self._length_ticks(value))
+        return totals
+
+    def _length_ticks(self, value) -> int:
+        """Convert a Measurement, measurement string or number of inches to 1/resolution inch ticks"""
+        if isinstance(value, Measurement):
+            if self.resolution == TICKS_PER_INCH:
+                return value.ticks
+            value = value.exact
+        elif isinstance(value, str):
+            value = _parse_exact(value)
+        elif isinstance(value, float):
+            value = Fraction(value)
+        return _round_fraction(value * self.resolution)
+
+    def evaluate_many(self, expressions, workers: int = None, chunk_size: int = 256):
+        """Evaluate expressions on a thread pool sharing this calculator, yielding BatchResults in order.
+
+        Threads share the warm compiled-expression cache. They only run in
+        parallel on free-threaded CPython builds, so by default more than one
+        thread is used only there; with one worker rows are evaluated inline.
+        At most two chunks per worker are in flight.
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        if workers is None:
+            import os
+            workers = 1 if _gil_enabled() else os.cpu_count() or 1
+        if workers <= 1:
+            yield from self._evaluate_rows(expressions)
+            return
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        expressions = iter(expressions)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='calculator') as executor:
+            pending = deque()
+            while True:
+                while len(pending) < 2 * workers:
+                    chunk = list(islice(expressions, chunk_size))
+                    if not chunk:
+                        break
+                    pending.append(executor.submit(lambda rows: list(self._evaluate_rows(rows)), chunk))
+                if not pending:
+                    break
+                yield from pending.popleft().result()
+
+    def _evaluate_rows(self, expressions):
+        """Yield a BatchResult per expression, capturing per-row errors"""
+        evaluate = self.evaluate_expression
+        for expression in expressions:
+            try:
+                yield BatchResult(expression, evaluate(expression), None)
+            except ValueError as e:
+                yield BatchResult(expression, None, str(e))
+
+    def evaluate_batch(self, template: str, columns: dict):
+        """Evaluate a template such as A + B - 3/4" x 2 over columns of values.
+
+        The template is parsed once and its names are bound to columns of
+        measurement strings or inch values; the postfix code then runs on
+        NumPy arrays. Returns a float64 array of inches. Rows that divide by
+        zero come back as inf or nan rather than raising.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("evaluate_batch requires NumPy. Install it with: pip install numpy")
+
+        for name in columns:
+            if not _is_name(name):
+                raise ValueError(f"Column name '{name}' cannot be used in a template")
+
+        key = self.normalize_expression(template)
+        tokens, error_msg = self._scan(key, allow_names=True)
+        if error_msg:
             raise ValueError(f"Format Error: {error_msg}")
-        
-        # Find all measurements and replace with inches
-        measurements = self._extract_measurements(expression)
-        processed_expression = expression
-        
-        # Sort measurements by length (longest first) to avoid partial replacements
-        sorted_measurements = sorted(measurements.items(), key=lambda x: len(x[0]), reverse=True)
-        
-        for measurement, inches_value in sorted_measurements:
-            processed_expression = processed_expression.replace(measurement, str(inches_value))
-        
-        # Replace common operators
-        processed_expression = processed_expression.replace('x', '*')
-        processed_expression = processed_expression.replace('X', '*')
-        processed_expression = processed_expression.replace('÷', '/')
-        
+        code = self._compile(key, tokens)
+
+        arrays = {}
+        rows = None
+        for name in dict.fromkeys(item for item in code if item.__class__ is _Name):
+            if name not in columns:
+                raise ValueError(f"No column given for '{name}' in template")
+            arrays[name] = values = self._column_inches(name, columns[name], np)
+            if rows is None:
+                rows = len(values)
+            elif len(values) != rows:
+                raise ValueError(f"Column '{name}' has {len(values)} rows, expected {rows}")
+
+        result = self._run_vector(code, arrays, np)
+        return np.array(np.broadcast_to(result, (1 if rows is None else rows,)), dtype=np.float64)
+
+    def _column_inches(self, name: str, column, np):
+        """Convert a column of inch values or measurement strings to a float64 array"""
+        values = np.asarray(column)
+        if values.dtype.kind in 'iuf':
+            return values.astype(np.float64, copy=False)
+
+        # Each distinct string is parsed once
+        parsed = {}
+        result = np.empty(len(values), dtype=np.float64)
+        for row, text in enumerate(values.tolist()):
+            inches = parsed.get(text)
+            if inches is None:
+                try:
+                    inches = parsed[text] = self.parse_measurement(str(text))
+                except ValueError as e:
+                    raise ValueError(f"Column '{name}' row {row}: {e}")
+            result[row] = inches
+        return result
+
+    def _run_vector(self, code: list, arrays: dict, np):
+        """Execute postfix code elementwise over NumPy arrays"""
+        stack = []
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for item in code:
+                item_class = item.__class__
+                if item_class is _Name:
+                    stack.append(arrays[item])
+                elif item_class is not str:
+                    stack.append(item)
+                elif item == 'neg':
+                    stack[-1] = np.negative(stack[-1])
+                else:
+                    right = stack.pop()
+                    left = stack[-1]
+                    if item == '+':
+                        stack[-1] = np.add(left, right)
+                    elif item == '-':
+                        stack[-1] = np.subtract(left, right)
+                    elif item == '*':
+                        stack[-1] = np.multiply(left, right)
+                    else:
+                        stack[-1] = np.true_divide(left, right)
+        return stack[0]
+
+    def to_ticks(self, inches: float) -> int:
+        """Convert inches to the nearest 1/resolution inch tick, ties away from zero"""
+        return _round_fraction(Fraction(inches) * self.resolution)
+
+    def format_ticks(self, ticks: int) -> str:
+        """Format an integer count of 1/resolution inch as feet and inches using integer math only"""
+        return _format_ticks(ticks, self.resolution)
+
+    def compile_expression(self, expression: str) -> tuple:
+        """Return postfix code for an expression, reusing cached compilations"""
+        key = self.normalize_expression(expression)
+        code = self._cache_lookup(key)
+        if code is None:
+            code = tuple(self._compile(key, self.tokenize(key), self.exact))
+            self._cache_store(key, code)
+        return code
+
+    def _cache_lookup(self, key: str):
+        """Return cached code for a normalized expression, or None on a miss"""
+        stripe = self._stripes[hash(key) & self._stripe_mask]
+        with stripe.lock:
+            code = stripe.entries.get(key)
+            if code is None:
+                stripe.misses += 1
+            else:
+                stripe.hits += 1
+                stripe.entries.move_to_end(key)
+        return code
+
+    def _cache_store(self, key: str, code: tuple):
+        """Add compiled code to the cache, evicting the stripe's least recently used entry.
+
+        Two threads that miss on the same key both compile it; the second
+        store simply replaces the first with equal code.
+        """
+        stripe = self._stripes[hash(key) & self._stripe_mask]
+        if stripe.maxsize > 0:
+            with stripe.lock:
+                stripe.entries[key] = code
+                if len(stripe.entries) > stripe.maxsize:
+                    stripe.entries.popitem(last=False)
+                    stripe.evictions += 1
+
+    def _evaluate_profiled(self, expression: str, ticks: bool):
+        """evaluate_expression / evaluate_ticks with each stage timed"""
+        timer = time.perf_counter_ns
+        record = self._record
+
+        start = timer()
+        key = self.normalize_expression(expression)
+        now = timer()
+        record('normalize', now - start)
+
+        start = now
+        code = self._cache_lookup(key)
+        now = timer()
+        record('cache_lookup', now - start)
+
+        if code is None:
+            start = now
+            try:
+                tokens = self.tokenize(key)
+            finally:
+                now = timer()
+                record('tokenize', now - start)
+            start = now
+            try:
+                code = tuple(self._compile(key, tokens, self.exact))
+            finally:
+                now = timer()
+                record('compile', now - start)
+            self._cache_store(key, code)
+
+        start = now
         try:
-            result = eval(processed_expression)
-            return float(result)
-        except Exception as e:
-            # Provide more helpful error messages
-            if "invalid syntax" in str(e):
-                return self._handle_syntax_error(expression, processed_expression)
+            if self.exact:
+                result = self._run_exact(code)
+                return result if ticks else result / self.resolution
+            result = self._run(code)
+            return self.to_ticks(result) if ticks else float(result)
+        finally:
+            record('run', timer() - start)
+
+    def enable_profiling(self):
+        """Start accumulating per-stage call counts and timings"""
+        with self._profile_lock:
+            if self._profile is None:
+                self._profile = {}
+
+    def disable_profiling(self):
+        """Stop profiling and discard collected timings"""
+        with self._profile_lock:
+            self._profile = None
+
+    def reset_profile(self):
+        """Clear collected timings, keeping profiling enabled if it was"""
+        with self._profile_lock:
+            if self._profile is not None:
+                self._profile = {}
+
+    def profile_stats(self) -> dict:
+        """Return {stage: {'calls', 'total_ns', 'max_ns'}} for the stages seen so far"""
+        with self._profile_lock:
+            profile = {stage: list(entry) for stage, entry in (self._profile or {}).items()}
+        return {stage: {'calls': profile[stage][0], 'total_ns': profile[stage][1], 'max_ns': profile[stage][2]}
+                for stage in PROFILE_STAGES if stage in profile}
+
+    def _record(self, stage: str, elapsed_ns: int):
+        """Add one timed call to a profiling stage"""
+        with self._profile_lock:
+            # Profiling may have been disabled by another thread mid-call
+            profile = self._profile
+            if profile is None:
+                return
+            entry = profile.get(stage)
+            if entry is None:
+                profile[stage] = [1, elapsed_ns, elapsed_ns]
             else:
-                raise ValueError(f"Calculation Error: {str(e)}. Please check your expression format.")
+                entry[0] += 1
+                entry[1] += elapsed_ns
+                if elapsed_ns > entry[2]:
+                    entry[2] = elapsed_ns
+
+    def normalize_expression(self, expression: str) -> str:
+        """Canonical form used as the cache key: single spaces, * and / operators"""
+        expression = ' '.join(expression.translate(_NORMALIZE_TABLE).split())
+        if 'x' in expression or 'X' in expression:
+            expression = _NORMALIZE_X_RE.sub('*', expression)
+        return expression
+
+    def cache_info(self) -> CacheInfo:
+        """Return hit/miss/eviction counters for the compiled-expression cache, summed over stripes"""
+        hits = misses = evictions = currsize = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                hits += stripe.hits
+                misses += stripe.misses
+                evictions += stripe.evictions
+                currsize += len(stripe.entries)
+        return CacheInfo(hits, misses, evictions, self.cache_size, currsize)
+
+    def cache_clear(self):
+        """Empty the compiled-expression cache and reset its counters"""
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.entries.clear()
+                stripe.hits = stripe.misses = stripe.evictions = 0
+
+    def _scan(self, expression: str, allow_names: bool = False) -> tuple[list[Token], str]:
+        """Tokenize in one pass and return (tokens, error_message)"""
+        tokens = list(_lex(expression))
+        return tokens, self._check_tokens(tokens, allow_names)
+
+    def _check_tokens(self, tokens: list[Token], allow_names: bool = False) -> str:
+        """Return the first format problem in a token list, or '' if there is none"""
+        for token in tokens:
+            kind = token.kind
+            if kind in _VALID_KINDS:
+                continue
+            text = token.text
+            if kind == NAME:
+                if not allow_names:
+                    return f"Unknown name '{text}' in expression. Example: 10' 2 1/2\""
+            elif kind == 'fraction':
+                return f"Found fraction '{text}' without inches (\") designation. Example: {text}\""
+            elif kind == 'zero_fraction':
+                # Quote it the same way whether or not the expression was normalized first
+                return f"Invalid fraction in '{' '.join(text.split())}': denominator cannot be zero."
+            else:
+                return f"Unexpected character '{text}' in expression. Example: 10' 2 1/2\""
+
+        # Plain numbers are only meaningful as multipliers or divisors
+        # Parentheses are boundaries, so the 3 in 2 * (3 + 1') is a bare number
+        count = len(tokens)
+        for index, token in enumerate(tokens):
+            if token.kind != NUMBER:
+                continue
+            first = last = index
+            while True:
+                # Step back over unary signs, e.g. the '-' in 2' * -3
+                while first > 1 and tokens[first - 1].kind == OP and tokens[first - 2].kind in (OP, LPAREN):
+                    first -= 1
+                # and out of parentheses that wrap only this number, e.g. (2) * 3'
+                if (0 < first and last + 1 < count
+                        and tokens[first - 1].kind == LPAREN and tokens[last + 1].kind == RPAREN):
+                    first -= 1
+                    last += 1
+                else:
+                    break
+            before = tokens[first - 1] if first > 0 else None
+            after = tokens[last + 1] if last + 1 < count else None
+            if not any(t is not None and t.kind == OP and t.value in '*/' for t in (before, after)):
+                return f"Found number '{token.text}' without feet (') or inches (\") designation. Example: 10' 2 1/2\""
+
+        return ""
+
+    def _compile(self, expression: str, tokens: list[Token], exact: bool = False) -> list:
+        """Convert tokens to postfix code (operand values and operator symbols)"""
+        output = []
+        operators = []
+        expect_operand = True
+
+        for token in tokens:
+            kind = token.kind
+            if expect_operand:
+                if kind == MEASURE or kind == NUMBER:
+                    output.append(self._exact_operand(token) if exact else token.value)
+                    expect_operand = False
+                elif kind == NAME:
+                    output.append(_Name(token.value))
+                    expect_operand = False
+                elif kind == LPAREN:
+                    operators.append('(')
+                elif kind == OP and token.value == '-':
+                    operators.append('neg')
+                elif kind == OP and token.value == '+':
+                    pass
+                else:
+                    self._handle_syntax_error(expression, tokens)
+            else:
+                if kind == OP:
+                    precedence = _PRECEDENCE[token.value]
+                    while operators and operators[-1] != '(' and _PRECEDENCE[operators[-1]] >= precedence:
+                        output.append(operators.pop())
+                    operators.append(token.value)
+                    expect_operand = True
+                elif kind == RPAREN:
+                    while operators and operators[-1] != '(':
+                        output.append(operators.pop())
+                    if not operators:
+                        self._handle_syntax_error(expression, tokens)
+                    operators.pop()
+                else:
+                    self._handle_syntax_error(expression, tokens)
+
+        if expect_operand:
+            self._handle_syntax_error(expression, tokens)
+        while operators:
+            operator = operators.pop()
+            if operator == '(':
+                self._handle_syntax_error(expression, tokens)
+            output.append(operator)
+        return output
+
+    def _run(self, code: list):
+        """Execute postfix code produced by _compile"""
+        stack = []
+        for item in code:
+            if item.__class__ is not str:
+                stack.append(item)
+            elif item == 'neg':
+                stack[-1] = -stack[-1]
+            else:
+                right = stack.pop()
+                left = stack[-1]
+                if item == '+':
+                    stack[-1] = left + right
+                elif item == '-':
+                    stack[-1] = left - right
+                elif item == '*':
+                    stack[-1] = left * right
+                elif right == 0:
+                    raise ValueError("Calculation Error: division by zero. Please check your expression format.")
+                else:
+                    stack[-1] = left / right
+        return stack[0]
+
+    def _exact_operand(self, token: Token):
+        """Exact-mode operand: int ticks for measurements, Fraction for plain numbers"""
+        if token.kind == NUMBER:
+            return Fraction(token.text)
+        match = _METRIC_RE.fullmatch(token.text)
+        exact_inches = _metric_exact(match) if match else _measurement_exact(_MEASUREMENT_RE.fullmatch(token.text))
+        return _round_fraction(exact_inches * self.resolution)
+
+    def _run_exact(self, code: tuple, raw: bool = False) -> int:
+        """Execute postfix code with int ticks as lengths and Fractions as scalars.
+
+        Addition, subtraction and multiplication by whole numbers stay in
+        integers. Scaling by a non-integer, dividing a length, and plain numbers
+        used as lengths round to the nearest tick, ties away from zero.
+        """
+        resolution = self.resolution
+        stack = []
+        for item in code:
+            if item.__class__ is not str:
+                stack.append(item)
+                continue
+            if item == 'neg':
+                stack[-1] = -stack[-1]
+                continue
+
+            right = stack.pop()
+            left = stack[-1]
+            left_is_length = left.__class__ is int
+            right_is_length = right.__class__ is int
+            if item == '+' or item == '-':
+                # A plain number added to a length counts as inches
+                if left_is_length != right_is_length:
+                    if left_is_length:
+                        right = _round_fraction(right * resolution)
+                    else:
+                        left = _round_fraction(left * resolution)
+                stack[-1] = left + right if item == '+' else left - right
+            elif item == '*':
+                if left_is_length and right_is_length:
+                    raise ValueError("Calculation Error: cannot multiply two measurements in exact mode.")
+                if left_is_length or right_is_length:
+                    length, scale = (left, right) if left_is_length else (right, left)
+                    if scale.denominator == 1:
+                        stack[-1] = length * scale.numerator
+                    else:
+                        stack[-1] = _round_fraction(length * scale)
+                else:
+                    stack[-1] = left * right
+            elif right == 0:
+                raise ValueError("Calculation Error: division by zero. Please check your expression format.")
+            elif left_is_length and right_is_length:
+                stack[-1] = Fraction(left, right)
+            elif left_is_length:
+                stack[-1] = _round_fraction(left / right)
+            elif right_is_length:
+                raise ValueError("Calculation Error: cannot divide a number by a measurement in exact mode.")
+            else:
+                stack[-1] = left / right
+
+        result = stack[0]
+        # raw keeps a plain-number result as a Fraction instead of converting it to ticks
+        if result.__class__ is not int and not raw:
+            result = _round_fraction(result * resolution)
+        return result
+
+    def _handle_syntax_error(self, expression: str, tokens: list[Token]):
+        """Raise a syntax error with a helpful message"""
+        # Two measurements in a row usually means a missing mark, e.g. 10' 11 instead of 10' 11"
+        for previous, token in zip(tokens, tokens[1:]):
+            if previous.kind in (MEASURE, NUMBER, NAME) and token.kind in (MEASURE, NUMBER, NAME):
+                raise ValueError("Format Error: Make sure measurements follow the format 10' 2 1/2\". Are you missing a ' or \" designation?")
 
-    def _handle_syntax_error(self, original_expr: str, processed_expr: str):
-        """Handle syntax errors with helpful messages"""
-        # Common issues that cause syntax errors
-        if re.search(r'\d+\s+\d+', original_expr):
-            raise ValueError("Format Error: Make sure measurements follow the format 10' 2 1/2\". Are you missing a ' or \" designation?")
-        
-        if "  " in processed_expr:
-            raise ValueError("Format Error: Invalid spacing in expression. Make sure measurements follow the format 10' 2 1/2\".")
-        
         # Check for unmatched parentheses
-        if processed_expr.count('(') != processed_expr.count(')'):
+        opened = sum(1 for token in tokens if token.kind == LPAREN)
+        closed = sum(1 for token in tokens if token.kind == RPAREN)
+        if opened != closed:
             raise ValueError("Format Error: Unmatched parentheses in expression.")
-        
+
         # Generic syntax error
         raise ValueError("Format Error: Invalid expression format. Make sure measurements follow the format 10' 2 1/2\". Are you missing a ' or \" designation?")
 
+    def measurements(self, expression: str) -> list[Measurement]:
+        """Return every measurement in an expression, in order, as Measurement values"""
+        return [Measurement(token.text) for token in self.tokenize(expression) if token.kind == MEASURE]
+
     def _extract_measurements(self, expression: str) -> dict:
         """Extract all measurements from expression and convert to inches"""
-        measurements = {}
-        
-        # Process from most specific to least specific to avoid partial matches
-        temp_expression = expression
-        
-        # First pass: feet with mixed fractions (e.g., "1' 2 3/4"")
-        matches = re.findall(r"\d+'\s*\d+\s+\d+/\d+\"", temp_expression)
-        for match in matches:
-            measurements[match] = self.parse_measurement(match)
-            temp_expression = temp_expression.replace(match, " PLACEHOLDER ")
-        
-        # Second pass: mixed numbers without feet (e.g., "0 1/2"")
-        matches = re.findall(r"(?<!['\d])\d+\s+\d+/\d+\"", temp_expression)
-        for match in matches:
-            measurements[match] = self.parse_measurement(match)
-            temp_expression = temp_expression.replace(match, " PLACEHOLDER ")
-        
-        # Third pass: feet with fractions
-        matches = re.findall(r"\d+'\s*\d+/\d+\"", temp_expression)
-        for match in matches:
-            measurements[match] = self.parse_measurement(match)
-            temp_expression = temp_expression.replace(match, " PLACEHOLDER ")
-        
-        # Fourth pass: feet with inches
-        matches = re.findall(r"\d+'\s*\d+\"", temp_expression)
-        for match in matches:
-            measurements[match] = self.parse_measurement(match)
-            temp_expression = temp_expression.replace(match, " PLACEHOLDER ")
-        
-        # Fifth pass: feet only
-        matches = re.findall(r"\d+'(?=\s|$|[+\-*/()])", temp_expression)
-        for match in matches:
-            measurements[match] = self.parse_measurement(match)
-            temp_expression = temp_expression.replace(match, " PLACEHOLDER ")
-        
-        # Sixth pass: pure fractions with quotes
-        matches = re.findall(r"(?<!['\d])\d+/\d+\"", temp_expression)
-        for match in matches:
-            measurements[match] = self.parse_measurement(match)
-            temp_expression = temp_expression.replace(match, " PLACEHOLDER ")
-        
-        # Seventh pass: inches only
-        matches = re.findall(r"(?<!['\d])\d+\"", temp_expression)
-        for match in matches:
-            measurements[match] = self.parse_measurement(match)
-        
-        return measurements
+        return {token.text: token.value for token in self.tokenize(expression) if token.kind == MEASURE}
 
     def _round_to_fraction(self, value: float, round_to_str: str) -> float:
         """Round value to the nearest specified fraction"""
-        try:
-            round_to_inches = self.parse_measurement(round_to_str)
-            if round_to_inches <= 0:
-                return value
-            return round(value / round_to_inches) * round_to_inches
-        except:
-            return value
+        return self.compile_rounding(round_to_str).apply(value)
+
+
+def _common_prefix_length(first: str, second: str) -> int:
+    """Length of the common prefix, found by bisecting on C-level slice compares"""
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[:middle] == second[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class IncrementalEvaluator:
+    """Re-evaluates an expression as it is edited, for live previews.
+
+    Each update re-scans only the tokens around the edited span and reuses
+    the values of unchanged top-level terms (the parts joined by + and -),
+    so typing into a long cut list does not redo the whole expression.
+    """
+
+    def __init__(self, calculator: FeetInchesCalculator, max_terms: int = 4096):
+        self.calculator = calculator
+        self.max_terms = max_terms
+        self.text = ''
+        self.tokens = []
+        self._ends = []
+        self._terms = {}
+
+    def update(self, text: str) -> float:
+        """Apply the new input text and return its value in inches.
+
+        Raises ValueError with the same messages as evaluate_expression.
+        """
+        tokens = self._relex(text)
+        self.text = text
+        self.tokens = tokens
+        self._ends = [token.end for token in tokens]
+
+        error_msg = self.calculator._check_tokens(tokens)
+        if error_msg:
+            raise ValueError(f"Format Error: {error_msg}")
+        return self._evaluate(text, tokens)
+
+    def _relex(self, text: str) -> list[Token]:
+        """Tokenize text, reusing the previous tokens outside the edited span"""
+        old_text, old_tokens, ends = self.text, self.tokens, self._ends
+        if not old_tokens:
+            return list(_lex(text))
+
+        prefix = _common_prefix_length(old_text, text)
+        suffix = _common_prefix_length(old_text[prefix:][::-1], text[prefix:][::-1])
+        delta = len(text) - len(old_text)
+        old_suffix_start = len(old_text) - suffix
+        new_edit_end = len(text) - suffix
+
+        # A measurement such as 1' 2 3/4" can absorb up to three tokens before
+        # the edit, so restart scanning three tokens earlier
+        restart = max(0, bisect_left(ends, prefix) - 3)
+        position = ends[restart - 1] if restart else 0
+
+        tokens = old_tokens[:restart]
+        for token in _lex(text, position):
+            tokens.append(token)
+            if token.end < new_edit_end:
+                continue
+            # Once a token ends where an old one did inside the unchanged
+            # suffix, the rest of the scan is the old tokens shifted by delta
+            old_end = token.end - delta
+            index = bisect_left(ends, old_end)
+            if old_end >= old_suffix_start and index < len(ends) and ends[index] == old_end:
+                rest = old_tokens[index + 1:]
+                if delta:
+                    rest = [Token(kind, token_text, value, start + delta, end + delta)
+                            for kind, token_text, value, start, end in rest]
+                tokens.extend(rest)
+                break
+        return tokens
+
+    def _evaluate(self, text: str, tokens: list[Token]) -> float:
+        """Evaluate by summing cached values of the top-level + and - terms"""
+        calculator = self.calculator
+        exact = calculator.exact
+
+        slices = []
+        operators = []
+        depth = 0
+        term_start = 0
+        previous_kind = None
+        for index, token in enumerate(tokens):
+            kind = token.kind
+            if kind == LPAREN:
+                depth += 1
+            elif kind == RPAREN:
+                depth -= 1
+            elif (kind == OP and depth == 0 and token.value in '+-'
+                  and previous_kind in (MEASURE, NUMBER, RPAREN)):
+                slices.append((term_start, index))
+                operators.append(token.value)
+                term_start = index + 1
+            previous_kind = kind
+        slices.append((term_start, len(tokens)))
+
+        if depth != 0 or any(start == end for start, end in slices):
+            # Let the full compiler produce the error message
+            calculator._compile(text, tokens, exact)
+
+        terms = self._terms
+        if len(terms) > self.max_terms:
+            terms.clear()
+        # Compile every new term before running any, so a syntax error anywhere
+        # is reported ahead of a calculation error, as evaluate_expression does
+        keys = [text[tokens[start].start:tokens[end - 1].end] for start, end in slices]
+        compiled = {}
+        for key, (start, end) in zip(keys, slices):
+            if key not in terms and key not in compiled:
+                try:
+                    compiled[key] = calculator._compile(text, tokens[start:end], exact)
+                except ValueError:
+                    # Word the error for the whole expression
+                    calculator._handle_syntax_error(text, tokens)
+
+        code = []
+        for term_index, key in enumerate(keys):
+            value = terms.get(key)
+            if value is None:
+                term_code = compiled[key]
+                value = calculator._run_exact(term_code, raw=True) if exact else calculator._run(term_code)
+                terms[key] = value
+            code.append(value)
+            if term_index:
+                code.append(operators[term_index - 1])
+
+        if exact:
+            return calculator._run_exact(code) / calculator.resolution
+        return float(calculator._run(code))
+
+
+# A model line such as: stud = wall - 3 x 1 1/2"
+_DEFINITION_RE = re.compile(r"\s*(?P<name>[A-Za-z_][A-Za-z_0-9]*)\s*=(?P<expression>.*)", re.DOTALL)
+
+
+class DimensionModel:
+    """Named dimensions that may refer to each other, e.g. stud = wall - 3 x 1 1/2".
+
+    Each definition is compiled once. Values are memoized, and redefining a
+    dimension only invalidates the dimensions downstream of it in the
+    dependency graph, so the next lookup recomputes just those. Circular
+    references are rejected when they are defined. In exact mode values are
+    held as integer ticks, otherwise as float inches.
+    """
+
+    def __init__(self, calculator: FeetInchesCalculator = None):
+        self.calculator = calculator or FeetInchesCalculator()
+        self._expressions = {}
+        self._code = {}
+        self._depends = {}
+        self._dependents = {}
+        self._values = {}
+
+    def define(self, name: str, expression: str) -> set[str]:
+        """Define or redefine a dimension; returns the names whose values were invalidated"""
+        if not _is_name(name):
+            raise ValueError(f"Format Error: Invalid dimension name '{name}'")
+        code = self._compile(expression)
+        depends = frozenset(item for item in code if item.__class__ is _Name)
+
+        # A cycle exists if the new definition depends on anything downstream of it
+        if name in depends or depends & self._downstream(name):
+            raise ValueError(f"Calculation Error: circular reference in '{name} = {expression.strip()}'")
+
+        for dependency in self._depends.get(name, ()):
+            self._dependents[dependency].discard(name)
+        for dependency in depends:
+            self._dependents.setdefault(dependency, set()).add(name)
+        self._expressions[name] = expression.strip()
+        self._code[name] = code
+        self._depends[name] = depends
+        return self._invalidate(name)
+
+    def define_line(self, line: str) -> str:
+        """Define a dimension from a line such as 'wall = 12' 6"'; returns its name"""
+        match = _DEFINITION_RE.fullmatch(line)
+        if not match:
+            raise ValueError(f"Format Error: Expected a definition like wall = 12' 6\", got '{line.strip()}'")
+        self.define(match.group('name'), match.group('expression'))
+        return match.group('name')
+
+    def remove(self, name: str) -> set[str]:
+        """Remove a dimension; returns the names whose values were invalidated"""
+        if name not in self._code:
+            raise KeyError(name)
+        invalidated = self._invalidate(name)
+        for dependency in self._depends.pop(name):
+            self._dependents[dependency].discard(name)
+        del self._expressions[name], self._code[name]
+        return invalidated
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._code
+
+    def __len__(self) -> int:
+        return len(self._code)
+
+    def names(self) -> list[str]:
+        return list(self._code)
+
+    def expression(self, name: str) -> str:
+        return self._expressions[name]
+
+    def dependencies(self, name: str) -> frozenset:
+        """Names the dimension's expression refers to directly"""
+        return self._depends[name]
+
+    def value(self, name: str) -> float:
+        """Value of a dimension in inches"""
+        value = self._resolve(name)
+        return value / self.calculator.resolution if self.calculator.exact else float(value)
+
+    def evaluate(self, expression: str) -> float:
+        """Evaluate an expression that may refer to the model's dimensions, in inches"""
+        calculator = self.calculator
+        value = self._run(self._compile(expression))
+        return value / calculator.resolution if calculator.exact else float(value)
+
+    def _compile(self, expression: str) -> tuple:
+        calculator = self.calculator
+        key = calculator.normalize_expression(expression)
+        tokens, error_msg = calculator._scan(key, allow_names=True)
+        if error_msg:
+            raise ValueError(f"Format Error: {error_msg}")
+        return tuple(calculator._compile(key, tokens, calculator.exact))
+
+    def _downstream(self, name: str) -> set:
+        """Every dimension that depends on name, directly or indirectly"""
+        seen = set()
+        pending = [name]
+        dependents = self._dependents
+        while pending:
+            for dependent in dependents.get(pending.pop(), ()):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    pending.append(dependent)
+        return seen
+
+    def _invalidate(self, name: str) -> set[str]:
+        invalidated = self._downstream(name)
+        invalidated.add(name)
+        for stale in invalidated:
+            self._values.pop(stale, None)
+        return invalidated
+
+    def _resolve(self, name: str):
+        """Memoized value of a dimension, computing stale dependencies first.
+
+        Walks the graph with an explicit stack so long chains of dimensions
+        do not hit the recursion limit.
+        """
+        values = self._values
+        if name in values:
+            return values[name]
+        if name not in self._code:
+            raise ValueError(f"Calculation Error: unknown dimension '{name}'")
+
+        stack = [name]
+        while stack:
+            current = stack[-1]
+            if current in values:
+                stack.pop()
+                continue
+            missing = [dependency for dependency in self._depends[current] if dependency not in values]
+            if not missing:
+                try:
+                    values[current] = self._run(self._code[current])
+                except ValueError as e:
+                    raise ValueError(f"{e} (in '{current}')") from None
+                stack.pop()
+                continue
+            for dependency in missing:
+                if dependency not in self._code:
+                    raise ValueError(f"Calculation Error: unknown dimension '{dependency}' (in '{current}')")
+                stack.append(dependency)
+        return values[name]
+
+    def _run(self, code: tuple):
+        """Run compiled code with each name replaced by its memoized value"""
+        code = [self._resolve(item) if item.__class__ is _Name else item for item in code]
+        if self.calculator.exact:
+            return self.calculator._run_exact(code)
+        return self.calculator._run(code)
+
+
+def _any_between(bits: int, low: int, high: int) -> bool:
+    """Whether any of the bits low..high (inclusive) is set"""
+    if high < 0:
+        return False
+    low = max(low, 0)
+    return (bits >> low) & ((1 << (high - low + 1)) - 1) != 0
+
+
+def find_combinations(target, pieces, tolerance=0, calculator: FeetInchesCalculator = None):
+    """Yield each multiset of pieces whose total is within tolerance of target.
+
+    pieces holds lengths or (length, quantity) pairs; lengths may be
+    measurement strings (read as parse_measurement does), Measurements or numbers
+    of inches, and are matched on the 1/64" grid. Each Combination lists its
+    pieces longest first. Longer pieces are tried first, so combinations with
+    few pieces tend to come early. Only branches that can still reach the
+    target are explored, so every step of the search leads to an answer.
+    """
+    calculator = calculator or FeetInchesCalculator()
+    if calculator.resolution != TICKS_PER_INCH:
+        raise ValueError("find_combinations needs a calculator with the 1/64\" resolution of Measurement")
+    ticks = calculator._length_ticks
+
+    target, tolerance = ticks(target), ticks(tolerance)
+    if tolerance < 0:
+        raise ValueError("Calculation Error: tolerance cannot be negative")
+    counts = {}
+    for piece in pieces:
+        quantity = 1
+        if isinstance(piece, tuple):
+            piece, quantity = piece
+        length, quantity = ticks(piece), int(quantity)
+        if length <= 0:
+            raise ValueError(f"Calculation Error: piece lengths must be greater than zero, got {piece}")
+        if quantity < 0:
+            raise ValueError(f"Calculation Error: piece quantities cannot be negative, got {quantity} of {piece}")
+        counts[length] = counts.get(length, 0) + quantity
+
+    low, high = target - tolerance, target + tolerance
+    lengths = sorted((length for length in counts if length <= high), reverse=True)
+    if high <= 0 or not lengths:
+        return
+
+    # reachable[i] is a bitset of the totals up to high that lengths[i:] can
+    # make; bounded counts are added in binary-split copies (1, 2, 4, ...)
+    mask = (1 << (high + 1)) - 1
+    reachable = [0] * len(lengths) + [1]
+    bits = 1
+    for index in range(len(lengths) - 1, -1, -1):
+        length, count, copies = lengths[index], counts[lengths[index]], 1
+        while count:
+            copies = min(copies, count)
+            bits |= (bits << (length * copies)) & mask
+            count -= copies
+            copies *= 2
+        reachable[index] = bits
+
+    # Depth-first over (next length index, remaining low, remaining high, chosen
+    # (length, count) pairs). A node's own answer takes none of the remaining
+    # lengths; its children take at least one more of some length.
+    stack = [(0, low, high, ())]
+    while stack:
+        index, remaining_low, remaining_high, chosen = stack.pop()
+        if chosen and remaining_low <= 0 <= remaining_high:
+            total = sum(length * count for length, count in chosen)
+            yield Combination(tuple(Measurement.from_ticks(length) for length, count in chosen for _ in range(count)),
+                              Measurement.from_ticks(total), Measurement.from_ticks(total - target))
+        children = []
+        for position in range(index, len(lengths)):
+            length = lengths[position]
+            if length > remaining_high:
+                continue
+            for count in range(min(counts[length], remaining_high // length), 0, -1):
+                if _any_between(reachable[position + 1], remaining_low - length * count,
+                                remaining_high - length * count):
+                    children.append((position + 1, remaining_low - length * count,
+                                     remaining_high - length * count, chosen + ((length, count),)))
+        # Longest length, most copies first
+        children.reverse()
+        stack.extend(children)
+
+
+# Per-process calculator used by evaluate_parallel workers
+_worker_calculator = None
+
+
+def _init_worker(calculator_options: dict):
+    """Create the calculator for one worker process"""
+    global _worker_calculator
+    _worker_calculator = FeetInchesCalculator(**calculator_options)
+
+
+def _evaluate_chunk(expressions: list) -> list:
+    """Evaluate a chunk of expressions in a worker, capturing per-row errors"""
+    results = list(_worker_calculator._evaluate_rows(expressions))
+    # Worker processes exit without cleanup, so write cached results per chunk
+    if _worker_calculator.result_cache is not None:
+        _worker_calculator.result_cache.flush()
+    return results
+
+
+def evaluate_parallel(expressions, workers: int = None, chunk_size: int = 1000, **calculator_options):
+    """Evaluate expressions across a process pool, yielding BatchResults in input order.
+
+    Each worker process holds one FeetInchesCalculator built from
+    calculator_options; pass result_cache as a path to share a persistent
+    cache between the workers. A row that fails carries its error message instead of
+    stopping the run. At most two chunks per worker are in flight, so large
+    inputs are streamed rather than loaded up front.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import os
+
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    workers = workers or os.cpu_count() or 1
+
+    expressions = iter(expressions)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(calculator_options,)) as executor:
+        pending = deque()
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(expressions, chunk_size))
+                if not chunk:
+                    break
+                pending.append(executor.submit(_evaluate_chunk, chunk))
+            if not pending:
+                break
+            yield from pending.popleft().result()
+
 
 def run_tests():
     """Import and run the comprehensive unit tests"""
@@ -290,3 +2033,85 @@ def run_tests():
     except Exception as e:
         print(f"Error running tests: {e}")
         return False
+
+
+def main(argv: list = None) -> int:
+    """Command line entry point: evaluate expressions line by line.
+
+    Reads from the given files (or stdin) and streams one result per input
+    line to stdout. Blank lines are echoed so output stays aligned with input.
+    Returns 1 if any line failed, otherwise 0.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='python -m calculator_engine',
+        description='Evaluate feet and inches expressions, one per line.')
+    parser.add_argument('files', nargs='*', default=['-'],
+                        help="input files; '-' or none reads stdin")
+    parser.add_argument('--round-to', metavar='SPEC', help='round results, e.g. 1/8" or 1/16" up')
+    parser.add_argument('--denominator', type=int, default=64, choices=FORMAT_DENOMINATORS,
+                        help='largest fraction denominator in output (default 64)')
+    parser.add_argument('--unit', default='ft-in', choices=OUTPUT_UNITS,
+                        help='output unit (default ft-in); inputs may mix feet, inches, mm, cm and m')
+    parser.add_argument('--exact', action='store_true', help='use exact integer 1/64" arithmetic')
+    parser.add_argument('--json', action='store_true', help='write one JSON object per line')
+    parser.add_argument('--cache', metavar='PATH', nargs='?', const='',
+                        help='reuse results from a persistent SQLite cache (default ~/.feet_inches_calculator_cache.sqlite)')
+    args = parser.parse_args(argv)
+
+    result_cache = None
+    if args.cache is not None:
+        from result_cache import DEFAULT_CACHE_PATH, ResultCache
+        result_cache = ResultCache(args.cache or DEFAULT_CACHE_PATH)
+    calculator = FeetInchesCalculator(exact=args.exact, denominator=args.denominator, unit=args.unit,
+                                      result_cache=result_cache)
+    try:
+        rounding = calculator.compile_rounding(args.round_to)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.json:
+        import json
+        dumps = json.dumps
+
+    write = sys.stdout.write
+    failed = False
+    for path in args.files:
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+        except OSError as e:
+            failed = True
+            sys.stderr.write(f'{path}: {e.strerror or e}\n')
+            continue
+        try:
+            for line_number, line in enumerate(stream, 1):
+                expression = line.strip()
+                if not expression:
+                    write('\n')
+                    continue
+                try:
+                    inches, result = calculator.solve(expression, rounding)
+                except ValueError as e:
+                    failed = True
+                    if args.json:
+                        write(dumps({'line': line_number, 'expression': expression, 'error': str(e)}) + '\n')
+                    else:
+                        write(f'Error: {e}\n')
+                        sys.stderr.write(f'{path}:{line_number}: {e}\n')
+                    continue
+                if args.json:
+                    write(dumps({'line': line_number, 'expression': expression,
+                                 'inches': inches, 'result': result}) + '\n')
+                else:
+                    write(result + '\n')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+    if result_cache is not None:
+        result_cache.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Cutting-stock optimizer
+Packs required pieces into stock lengths, allowing for the saw kerf, so that
+as little stock as possible is used. Lengths are parsed with the engine's
+parse_measurement and packed as integer 1/64" ticks. A best-fit-decreasing
+pass gives the first plan, which is then improved by repeatedly repacking a
+few boards at a time until the time budget runs out.
+
+Command line:
+    python cut_optimizer.py cutlist.txt --stock "8'" "12'" "16'" --kerf '1/8"' --time-limit 2
+Each input line is a length, optionally followed by a comma and a quantity.
+"""
+
+import argparse
+import random
+import sys
+import time
+from bisect import bisect_left, insort
+from typing import NamedTuple
+
+from calculator_engine import TICKS_PER_INCH, FeetInchesCalculator, Measurement
+
+DEFAULT_STOCK = ("8'", "10'", "12'", "16'")
+
+
+class Board(NamedTuple):
+    """One stock length and the pieces cut from it, all in 1/64" ticks"""
+    stock: int
+    pieces: tuple
+    offcut: int  # length left over after the last cut
+
+
+class CutPlan:
+    """The boards of a cutting plan and its totals, in 1/64" ticks"""
+
+    def __init__(self, boards: list, kerf: int):
+        self.boards = sorted(boards, key=lambda board: (-board.stock, board.offcut, board.pieces))
+        self.kerf = kerf
+
+    @property
+    def stock_used(self) -> int:
+        return sum(board.stock for board in self.boards)
+
+    @property
+    def piece_total(self) -> int:
+        return sum(sum(board.pieces) for board in self.boards)
+
+    @property
+    def waste(self) -> int:
+        """Stock not turned into pieces: kerf losses plus offcuts"""
+        return self.stock_used - self.piece_total
+
+    def stock_counts(self) -> dict:
+        """{stock length: boards used}, longest first"""
+        counts = {}
+        for board in self.boards:
+            counts[board.stock] = counts.get(board.stock, 0) + 1
+        return counts
+
+    def report(self, calculator: FeetInchesCalculator = None, round_to=None) -> list[str]:
+        """Human-readable plan: one line per distinct board layout, then the totals"""
+        calculator = calculator or FeetInchesCalculator()
+        length = lambda ticks: calculator.format_result(ticks / TICKS_PER_INCH, round_to)
+
+        layouts = {}
+        for board in self.boards:
+            layouts[board] = layouts.get(board, 0) + 1
+        lines = [f"{count} x {length(board.stock)}: {', '.join(map(length, board.pieces))}"
+                 f" | offcut {length(board.offcut)}" for board, count in layouts.items()]
+
+        stock = ', '.join(f"{count} x {length(stock)}" for stock, count in self.stock_counts().items())
+        percent = 100 * self.waste / self.stock_used if self.boards else 0.0
+        lines.append(f"Stock: {stock or 'none'} = {length(self.stock_used)}")
+        lines.append(f"Pieces: {length(self.piece_total)}    Waste: {length(self.waste)} ({percent:.1f}%)")
+        return lines
+
+
+def _length_ticks(value, calculator: FeetInchesCalculator) -> int:
+    """A measurement string (via parse_measurement), Measurement or number of inches as ticks"""
+    if isinstance(value, str):
+        value = calculator.parse_measurement(value)
+    return Measurement(value).ticks
+
+
+def _expand_pieces(pieces, calculator: FeetInchesCalculator) -> list[int]:
+    """Piece lengths in ticks; an item may be a length or a (length, quantity) pair"""
+    lengths = []
+    for piece in pieces:
+        quantity = 1
+        if isinstance(piece, tuple):
+            piece, quantity = piece
+        ticks = _length_ticks(piece, calculator)
+        if ticks <= 0:
+            raise ValueError(f"Calculation Error: piece lengths must be greater than zero, got {piece}")
+        lengths.extend([ticks] * int(quantity))
+    return lengths
+
+
+def _pack(sizes: list, capacity: int) -> list[list]:
+    """Best-fit the sizes, in the given order, into bins of capacity; returns [used, sizes] per bin"""
+    smallest = min(sizes)
+    bins = []
+    free = []  # sorted (remaining, bin index) for bins that can still take the smallest size
+    for size in sizes:
+        position = bisect_left(free, (size, -1))
+        if position < len(free):
+            remaining, index = free.pop(position)
+        else:
+            remaining, index = capacity, len(bins)
+            bins.append([0, []])
+        bin_ = bins[index]
+        bin_[0] += size
+        bin_[1].append(size)
+        remaining -= size
+        if remaining >= smallest:
+            insort(free, (remaining, index))
+    return bins
+
+
+def _boards(bins: list, stocks: list, kerf: int) -> list[tuple]:
+    """Put each packed bin on the shortest stock that holds it: (stock, used, sizes)"""
+    boards = []
+    for used, sizes in bins:
+        # Sizes include one kerf per piece; the last cut is not needed when a board fits exactly
+        stock = stocks[bisect_left(stocks, used - kerf)]
+        boards.append((stock, used, tuple(sorted(sizes, reverse=True))))
+    return boards
+
+
+def _cost(boards) -> tuple:
+    """Smaller is better: stock used, then boards, then spread (uneven fill frees boards later)"""
+    return (sum(board[0] for board in boards), len(boards), -sum(board[1] * board[1] for board in boards))
+
+
+def _improve(boards: list, stocks: list, kerf: int, deadline: float, rng: random.Random) -> list:
+    """Ruin and recreate: repack a few boards at a time, keeping changes that are no worse.
+
+    Stops at the deadline, or once many attempts in a row have not saved any stock.
+    """
+    patience = max(2000, 20 * len(boards))
+    stale = 0
+    while len(boards) > 1 and stale < patience and time.perf_counter() < deadline:
+        stale += 1
+        count = len(boards)
+        # The emptiest of a few random boards, plus some others to trade pieces with
+        worst = max(rng.sample(range(count), min(4, count)), key=lambda i: boards[i][0] - boards[i][1])
+        chosen = {worst}
+        chosen.update(rng.sample(range(count), min(rng.randint(1, 5), count - 1)))
+        old = [boards[i] for i in chosen]
+
+        sizes = [size for board in old for size in board[2]]
+        if rng.random() < 0.5:
+            sizes.sort(reverse=True)
+        else:
+            sizes.sort(key=lambda size: size * (0.75 + rng.random() / 2), reverse=True)
+        fitting = [stock for stock in stocks if stock + kerf >= max(sizes)]
+        new = _boards(_pack(sizes, rng.choice(fitting) + kerf), stocks, kerf)
+
+        new_cost, old_cost = _cost(new), _cost(old)
+        if new_cost[:2] < old_cost[:2]:
+            stale = 0
+        if new_cost <= old_cost:
+            for index in sorted(chosen, reverse=True):
+                boards[index] = boards[-1]
+                boards.pop()
+            boards.extend(new)
+    return boards
+
+
+def optimize_cuts(pieces, stock=DEFAULT_STOCK, kerf='1/8"', time_limit: float = 1.0, seed: int = 0,
+                  calculator: FeetInchesCalculator = None) -> CutPlan:
+    """Plan how to cut pieces from stock lengths using as little stock as possible.
+
+    pieces holds lengths or (length, quantity) pairs; lengths, stock and kerf
+    may be measurement strings, Measurements or numbers of inches. Each cut
+    removes one kerf. Any number of boards of each stock length may be used.
+    The plan is improved until time_limit seconds have passed or it stops
+    getting better.
+    """
+    calculator = calculator or FeetInchesCalculator()
+    deadline = time.perf_counter() + time_limit
+    stocks = sorted({_length_ticks(length, calculator) for length in stock})
+    if not stocks or stocks[0] <= 0:
+        raise ValueError("Calculation Error: stock lengths must be greater than zero")
+    kerf = _length_ticks(kerf, calculator)
+    if kerf < 0:
+        raise ValueError("Calculation Error: kerf cannot be negative")
+
+    lengths = _expand_pieces(pieces, calculator)
+    if not lengths:
+        return CutPlan([], kerf)
+    longest = max(lengths)
+    if longest > stocks[-1]:
+        length = lambda ticks: calculator.format_result(ticks / TICKS_PER_INCH)
+        raise ValueError(f"Calculation Error: piece {length(longest)} is longer than the longest stock "
+                         f"length {length(stocks[-1])}")
+
+    # Packing with one kerf added to every piece and to the capacity allows a
+    # kerf between neighbouring pieces and after the last one
+    sizes = sorted((length + kerf for length in lengths), reverse=True)
+    candidates = [_boards(_pack(sizes, stock + kerf), stocks, kerf) for stock in stocks if stock >= longest]
+    boards = min(candidates, key=_cost)
+
+    boards = _improve(boards, stocks, kerf, deadline, random.Random(seed))
+
+    return CutPlan([Board(stock, tuple(size - kerf for size in sizes), max(0, stock - used))
+                    for stock, used, sizes in boards], kerf)
+
+
+def read_cut_list(lines) -> list[tuple]:
+    """(length, quantity) pairs from lines of 'length' or 'length, quantity'; blank lines are skipped"""
+    pieces = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        length, _, quantity = line.partition(',')
+        try:
+            pieces.append((length.strip(), int(quantity) if quantity.strip() else 1))
+        except ValueError:
+            raise ValueError(f"Format Error: line {line_number}: quantity must be a whole number: {line}")
+    return pieces
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Plan cuts of pieces from stock lengths with the least waste.')
+    parser.add_argument('file', nargs='?', default='-', help="cut list, one 'length[, quantity]' per line")
+    parser.add_argument('--stock', nargs='+', default=list(DEFAULT_STOCK),
+                        help="available stock lengths (default 8' 10' 12' 16')")
+    parser.add_argument('--kerf', default='1/8"', help='material lost per cut (default 1/8")')
+    parser.add_argument('--time-limit', type=float, default=1.0, help='seconds to spend improving (default 1)')
+    parser.add_argument('--round-to', metavar='SPEC', help='round reported lengths, e.g. 1/16"')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the improvement phase')
+    args = parser.parse_args(argv)
+
+    try:
+        stream = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')
+    except OSError as e:
+        print(f"Error: {args.file}: {e.strerror or e}", file=sys.stderr)
+        return 1
+    try:
+        pieces = read_cut_list(stream)
+        plan = optimize_cuts(pieces, args.stock, args.kerf, args.time_limit, args.seed)
+        report = plan.report(round_to=args.round_to)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print('\n'.join(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,479 @@
+"""
+Differential fuzzing for the calculator engine
+Generates random expressions in the calculator's notation, runs them through
+every evaluation path and checks the paths against each other and against
+exact values the generator computes itself. Mismatches are reported with a
+minimized reproducer, along with the throughput of each path.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from fractions import Fraction
+
+from calculator_engine import FeetInchesCalculator, IncrementalEvaluator, Measurement, load_measurements
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TICKS = 64
+ROUNDING_SPECS = (None, '1/8"', '1/16"', '1/4" up', '1/2" down', '1"')
+
+# Expression trees are tuples:
+#   ('measure', text, inches)          a measurement such as 10' 2 1/2"
+#   ('add', operator, left, right)     operator is '+' or '-' with its spacing
+#   ('scale', operator, length, number, number_first)
+#                                      operator is one of * x X / ÷ with its spacing
+#   ('neg', length)                    unary minus
+
+
+def _round_half_away(value: Fraction) -> int:
+    """Nearest integer with ties away from zero (kept separate from the engine's helper)"""
+    whole = abs(value.numerator) * 2 + value.denominator
+    rounded = whole // (2 * value.denominator)
+    return rounded if value >= 0 else -rounded
+
+
+def random_measurement(rng: random.Random) -> tuple:
+    """A random measurement leaf in one of the notations parse_measurement accepts"""
+    feet = rng.randint(0, 30)
+    inches = rng.randint(0, 11)
+    denominator = rng.choice((2, 4, 8, 16, 32, 64, 64, 3, 10))
+    numerator = rng.randint(1, denominator * 2 if rng.random() < 0.1 else denominator - 1)
+    space = rng.choice((' ', ' ', '', '  '))
+    style = rng.randrange(9)
+    if style == 8:
+        # Metric, converted with the exact 25.4 mm per inch
+        unit, per_unit = rng.choice((('mm', 1), ('cm', 10), ('m', 1000)))
+        amount = rng.choice((str(rng.randint(1, 3000)), f'{rng.randint(0, 99)}.{rng.randint(0, 99)}'))
+        return ('measure', f'{amount}{rng.choice(("", " "))}{unit}', Fraction(amount) * per_unit / Fraction('25.4'))
+    if style == 0:
+        text, value = f"{feet}'", Fraction(feet * 12)
+    elif style == 1:
+        text, value = f'{inches}"', Fraction(inches)
+    elif style == 2:
+        digits = rng.randint(0, 999)
+        text, value = f'{inches}.{digits}"', Fraction(f'{inches}.{digits}')
+    elif style == 3:
+        text, value = f'{numerator}/{denominator}"', Fraction(numerator, denominator)
+    elif style == 4:
+        text, value = f'{inches} {numerator}/{denominator}"', inches + Fraction(numerator, denominator)
+    elif style == 5:
+        text, value = f"{feet}'{space}{inches}\"", Fraction(feet * 12 + inches)
+    elif style == 6:
+        text, value = f"{feet}'{space}{numerator}/{denominator}\"", feet * 12 + Fraction(numerator, denominator)
+    else:
+        text = f"{feet}'{space}{inches} {numerator}/{denominator}\""
+        value = feet * 12 + inches + Fraction(numerator, denominator)
+    return ('measure', text, value)
+
+
+def random_number(rng: random.Random) -> str:
+    """A non-zero plain number used to scale a length"""
+    if rng.random() < 0.7:
+        return str(rng.randint(1, 12))
+    return rng.choice(('0.5', '1.5', '2.25', '0.125', '3.75', '0.1'))
+
+
+def _spaced(rng: random.Random, operator: str) -> str:
+    return rng.choice((' {} ', '{}', ' {}', '{} ')).format(operator)
+
+
+def random_tree(rng: random.Random, depth: int = 4) -> tuple:
+    """A random valid length expression tree"""
+    if depth <= 0 or rng.random() < 0.3:
+        return random_measurement(rng)
+    choice = rng.random()
+    if choice < 0.55:
+        return ('add', _spaced(rng, rng.choice('+-')), random_tree(rng, depth - 1), random_tree(rng, depth - 1))
+    if choice < 0.9:
+        operator = rng.choice(('*', 'x', 'X', '/', '÷', '*'))
+        number_first = operator in '*xX' and rng.random() < 0.3
+        # Keep x and X spaced out as people type them; the symbols vary their spacing
+        spacing = ' {} ' if operator in 'xX' else _spaced(rng, '{}')
+        return ('scale', spacing.format(operator), random_tree(rng, depth - 1), random_number(rng), number_first)
+    return ('neg', random_tree(rng, depth - 1))
+
+
+def render(tree: tuple) -> str:
+    """Text for a tree, with the parentheses its structure needs"""
+    kind = tree[0]
+    if kind == 'measure':
+        return tree[1]
+    if kind == 'add':
+        _, operator, left, right = tree
+        right_text = render(right)
+        if right[0] == 'add':
+            right_text = f'({right_text})'
+        return f'{render(left)}{operator}{right_text}'
+    if kind == 'scale':
+        _, operator, length, number, number_first = tree
+        length_text = render(length)
+        if length[0] == 'add' or (number_first and length[0] == 'scale'):
+            length_text = f'({length_text})'
+        elif operator == '/' and length_text[-1].isdigit():
+            # 8/5 right after a number would read as a fraction without its inch mark
+            operator = ' / '
+        return f'{number}{operator}{length_text}' if number_first else f'{length_text}{operator}{number}'
+    child = tree[1]
+    text = render(child)
+    if child[0] in ('add', 'scale'):
+        text = f'({text})'
+    return f'-{text}'
+
+
+def tree_value(tree: tuple) -> tuple[Fraction, int]:
+    """(true value in inches, exact-mode result in 1/64" ticks) following the documented rules"""
+    kind = tree[0]
+    if kind == 'measure':
+        return tree[2], _round_half_away(tree[2] * TICKS)
+    if kind == 'add':
+        _, operator, left, right = tree
+        (left_true, left_ticks), (right_true, right_ticks) = tree_value(left), tree_value(right)
+        if operator.strip() == '+':
+            return left_true + right_true, left_ticks + right_ticks
+        return left_true - right_true, left_ticks - right_ticks
+    if kind == 'scale':
+        _, operator, length, number, _ = tree
+        true, ticks = tree_value(length)
+        scale = Fraction(number)
+        if operator.strip() in '/÷':
+            return true / scale, _round_half_away(ticks / scale)
+        if scale.denominator == 1:
+            return true * scale, ticks * scale.numerator
+        return true * scale, _round_half_away(ticks * scale)
+    true, ticks = tree_value(tree[1])
+    return -true, -ticks
+
+
+def measurements_in(tree: tuple):
+    """Every measurement leaf in a tree"""
+    if tree[0] == 'measure':
+        yield tree
+    else:
+        for child in tree[1:]:
+            if isinstance(child, tuple):
+                yield from measurements_in(child)
+
+
+def reference_format(inches: Fraction, round_to: str = None) -> str:
+    """Format an exact value as feet and inches, written independently of the engine"""
+    if round_to:
+        increment_text, _, mode = round_to.partition(' ')
+        increment = Fraction(increment_text.rstrip('"'))
+        steps = inches / increment
+        if mode == 'up':
+            steps = -(-steps.numerator // steps.denominator)
+        elif mode == 'down':
+            steps = steps.numerator // steps.denominator
+        else:
+            steps = _round_half_away(steps)
+        inches = steps * increment
+    ticks = _round_half_away(inches * TICKS)
+    if ticks == 0:
+        return '0"'
+    sign = '-' if ticks < 0 else ''
+    feet, remainder = divmod(abs(ticks), 12 * TICKS)
+    whole, sixty_fourths = divmod(remainder, TICKS)
+    if sixty_fourths:
+        fraction = Fraction(sixty_fourths, TICKS)
+        inch_text = f'{fraction.numerator}/{fraction.denominator}"'
+        if whole:
+            inch_text = f'{whole} {inch_text}'
+    else:
+        inch_text = f'{whole}"' if whole else ''
+    if feet and inch_text:
+        return f"{sign}{feet}' {inch_text}"
+    return f"{sign}{feet}'" if feet else sign + inch_text
+
+
+def _near_boundary(inches: Fraction, round_to: str = None) -> bool:
+    """True when float noise could legitimately move the formatted result"""
+    if round_to:
+        increment_text, _, mode = round_to.partition(' ')
+        steps = inches / Fraction(increment_text.rstrip('"'))
+        if mode:
+            return steps.denominator != 1 and abs(steps - round(steps)) < Fraction(1, 10 ** 7)
+        inches = _round_half_away(steps) * Fraction(increment_text.rstrip('"'))
+        if abs(abs(steps - int(steps)) - Fraction(1, 2)) < Fraction(1, 10 ** 7):
+            return True
+    scaled = abs(inches * TICKS)
+    return abs(scaled - int(scaled) - Fraction(1, 2)) < Fraction(1, 10 ** 7)
+
+
+def mutate(rng: random.Random, text: str) -> str:
+    """Damage a valid expression in one of the ways people mistype them"""
+    choice = rng.randrange(9)
+    position = rng.randint(0, len(text))
+    if choice == 0:
+        quotes = [i for i, c in enumerate(text) if c in '\'"']
+        if quotes:
+            i = rng.choice(quotes)
+            return text[:i] + text[i + 1:]
+    if choice == 1:
+        return text[:position] + rng.choice(('(', ')')) + text[position:]
+    if choice == 2:
+        return text + rng.choice((' +', ' *', ' /', '-', ' x'))
+    if choice == 3:
+        return text[:position] + f' {rng.randint(1, 99)} ' + text[position:]
+    if choice == 4:
+        return text[:position] + rng.choice(('abc', '#', '&', '.', ',', 'x')) + text[position:]
+    if choice == 5:
+        return text.replace('/', '/0', 1) if '/' in text else text + ' / 0'
+    if choice == 6:
+        return text[:position] + rng.choice(('++', '*/', '()', ' x x ')) + text[position:]
+    if choice == 7:
+        return f"{text} * 1'"
+    if position < len(text):
+        return text[:position] + text[position + 1:]
+    return text + '"'
+
+
+def shrink_candidates(tree: tuple):
+    """Smaller trees to try when minimizing, simplest first"""
+    kind = tree[0]
+    if kind == 'measure':
+        if tree[1] != '1"':
+            yield ('measure', '1"', Fraction(1))
+        return
+    children = [(index, child) for index, child in enumerate(tree) if isinstance(child, tuple)]
+    for _, child in children:
+        yield child
+    if kind == 'scale' and tree[3] != '2':
+        yield tree[:3] + ('2',) + tree[4:]
+    for index, child in children:
+        for smaller in shrink_candidates(child):
+            yield tree[:index] + (smaller,) + tree[index + 1:]
+
+
+def minimize_tree(tree: tuple, fails) -> tuple:
+    """Greedily shrink a tree while fails(tree) stays true"""
+    improved = True
+    while improved:
+        improved = False
+        for candidate in shrink_candidates(tree):
+            if fails(candidate):
+                tree = candidate
+                improved = True
+                break
+    return tree
+
+
+def minimize_text(text: str, fails) -> str:
+    """Delta-debug a failing string down to a smaller one that still fails"""
+    chunks = 2
+    while len(text) > 1:
+        size = max(1, len(text) // chunks)
+        for start in range(0, len(text), size):
+            candidate = text[:start] + text[start + size:]
+            if candidate.strip() and fails(candidate):
+                text = candidate
+                chunks = max(chunks - 1, 2)
+                break
+        else:
+            if size == 1:
+                break
+            chunks = min(len(text), chunks * 2)
+    return text
+
+
+class DifferentialFuzzer:
+    """Runs generated expressions through each engine path and collects mismatches"""
+
+    def __init__(self, seed: int = 0, max_depth: int = 4):
+        self.rng = random.Random(seed)
+        self.max_depth = max_depth
+        self.calculator = FeetInchesCalculator()
+        self.cold = FeetInchesCalculator(cache_size=0)
+        self.exact = FeetInchesCalculator(exact=True)
+        self.incremental = IncrementalEvaluator(FeetInchesCalculator())
+        self.timings = {}
+        self.mismatches = []
+        self.leaves = []
+
+    def _timed(self, path: str, function, *args):
+        """Call function, charging its time to path; returns (value, error message)"""
+        start = time.perf_counter_ns()
+        try:
+            return function(*args), None
+        except ValueError as e:
+            return None, str(e)
+        finally:
+            stats = self.timings.setdefault(path, [0, 0])
+            stats[0] += 1
+            stats[1] += time.perf_counter_ns() - start
+
+    def _incremental(self, text: str) -> float:
+        # Simulate typing: first a partial edit, then the full text
+        try:
+            self.incremental.update(text[:len(text) // 2])
+        except ValueError:
+            pass
+        return self.incremental.update(text)
+
+    def check_tree(self, tree: tuple, round_to: str = None) -> list[str]:
+        """Problems found evaluating a valid expression tree, as short descriptions"""
+        text = render(tree)
+        true, ticks = tree_value(tree)
+        problems = []
+
+        value, error = self._timed('evaluate', self.calculator.evaluate_expression, text)
+        if error is not None:
+            return [f"evaluate raised: {error}"]
+        if abs(value - true) > 1e-9 * max(1, abs(true)):
+            problems.append(f"evaluate gave {value!r}, expected {float(true)!r}")
+
+        cold, error = self._timed('evaluate_uncached', self.cold.evaluate_expression, text)
+        if error is not None or cold != value:
+            problems.append(f"uncached evaluate gave {cold!r} ({error}), cached gave {value!r}")
+
+        exact, error = self._timed('evaluate_exact', self.exact.evaluate_ticks, text)
+        if exact != ticks:
+            problems.append(f"exact mode gave {exact} ticks ({error}), expected {ticks}")
+
+        incremental, error = self._timed('incremental', self._incremental, text)
+        if error is not None or abs(incremental - value) > 1e-9 * max(1, abs(value)):
+            problems.append(f"incremental gave {incremental!r} ({error}), evaluate gave {value!r}")
+
+        formatted, error = self._timed('format', self.calculator.format_result, value, round_to)
+        if not _near_boundary(true, round_to) and formatted != reference_format(true, round_to):
+            problems.append(f"format_result({value!r}, {round_to!r}) gave {formatted!r}, "
+                            f"expected {reference_format(true, round_to)!r}")
+
+        if numpy is not None:
+            batch, error = self._timed('evaluate_batch', self.calculator.evaluate_batch, text, {})
+            if error is not None or abs(batch[0] - value) > 1e-9 * max(1, abs(value)):
+                problems.append(f"evaluate_batch gave {batch!r} ({error}), evaluate gave {value!r}")
+
+        for leaf in measurements_in(tree):
+            parsed, error = self._timed('parse', self.calculator.parse_measurement, leaf[1])
+            if error is not None or abs(parsed - leaf[2]) > 1e-9 * max(1, leaf[2]):
+                problems.append(f"parse_measurement({leaf[1]!r}) gave {parsed!r} ({error})")
+            measurement, error = self._timed('measurement', Measurement, leaf[1])
+            if error is not None or measurement.ticks != _round_half_away(leaf[2] * TICKS):
+                problems.append(f"Measurement({leaf[1]!r}) gave {measurement!r} ({error})")
+        return problems
+
+    def check_text(self, text: str) -> list[str]:
+        """Problems found evaluating arbitrary (usually invalid) text: the paths must agree"""
+        value, error = self._timed('evaluate', self.calculator.evaluate_expression, text)
+        results = {'evaluate': (value, error)}
+        results['evaluate_uncached'] = self._timed('evaluate_uncached', self.cold.evaluate_expression, text)
+        results['incremental'] = self._timed('incremental', self._incremental, text)
+        problems = [f"{path} gave {result!r}, evaluate gave {(value, error)!r}"
+                    for path, result in results.items() if result != (value, error)
+                    and not (result[1] is None and error is None and abs(result[0] - value) <= 1e-9 * max(1, abs(value)))]
+
+        valid, message = self.calculator.validate_expression(text)
+        if not valid and error is None:
+            problems.append(f"validate_expression rejected it ({message}) but evaluate gave {value!r}")
+        if error is not None and error.startswith('Format Error'):
+            # Format errors do not depend on the arithmetic mode
+            _, exact_error = self._timed('evaluate_exact', self.exact.evaluate_ticks, text)
+            if exact_error != error:
+                problems.append(f"exact mode raised {exact_error!r}, evaluate raised {error!r}")
+        return problems
+
+    def check_loader(self) -> list[str]:
+        """Load every measurement seen so far through load_measurements and compare"""
+        if not self.leaves:
+            return []
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+            f.write('\n'.join(self.leaves))
+        try:
+            start = time.perf_counter_ns()
+            loaded, errors = load_measurements(f.name)
+            stats = self.timings.setdefault('load_measurements', [0, 0])
+            stats[0] += len(self.leaves)
+            stats[1] += time.perf_counter_ns() - start
+        finally:
+            os.remove(f.name)
+        expected = [Measurement(text).ticks for text in self.leaves]
+        problems = [f"load_measurements reported {error}" for error in errors[:5]]
+        for text, got, want in zip(self.leaves, loaded.ticks, expected):
+            if got != want:
+                problems.append(f"load_measurements read {text!r} as {got} ticks, expected {want}")
+                break
+        if len(loaded) != len(expected):
+            problems.append(f"load_measurements returned {len(loaded)} rows, expected {len(expected)}")
+        self.leaves = []
+        return problems
+
+    def _record(self, kind: str, original: str, minimized: str, problems: list[str]):
+        self.mismatches.append({'kind': kind, 'input': original, 'minimized': minimized, 'problems': problems})
+
+    def run(self, count: int, time_limit: float = None, invalid_ratio: float = 0.3, progress=None) -> int:
+        """Check up to count expressions (or until time_limit seconds pass); returns how many ran"""
+        rng = self.rng
+        deadline = time.monotonic() + time_limit if time_limit else None
+        done = 0
+        while done < count and (deadline is None or time.monotonic() < deadline):
+            tree = random_tree(rng, rng.randint(0, self.max_depth))
+            if rng.random() < invalid_ratio:
+                text = mutate(rng, render(tree))
+                problems = self.check_text(text)
+                if problems:
+                    minimized = minimize_text(text, lambda candidate: bool(self.check_text(candidate)))
+                    self._record('invalid', text, minimized, problems)
+            else:
+                round_to = rng.choice(ROUNDING_SPECS)
+                problems = self.check_tree(tree, round_to)
+                if problems:
+                    smallest = minimize_tree(tree, lambda candidate: bool(self.check_tree(candidate, round_to)))
+                    self._record('valid', render(tree), render(smallest), problems)
+                self.leaves.extend(leaf[1] for leaf in measurements_in(tree))
+                if len(self.leaves) >= 50000:
+                    problems = self.check_loader()
+                    if problems:
+                        self._record('loader', '', '', problems)
+            done += 1
+            if progress and done % progress == 0:
+                print(f"{done:,} expressions, {len(self.mismatches)} mismatches", file=sys.stderr)
+
+        problems = self.check_loader()
+        if problems:
+            self._record('loader', '', '', problems)
+        return done
+
+    def throughput(self) -> dict:
+        """{path: calls per second} over everything run so far"""
+        return {path: calls / (ns / 1e9) if ns else 0.0 for path, (calls, ns) in self.timings.items()}
+
+
+def main(argv: list = None) -> int:
+    """Run the fuzzer; returns 1 if any mismatch was found"""
+    parser = argparse.ArgumentParser(description='Differentially fuzz the calculator engine.')
+    parser.add_argument('--count', type=int, default=100000, help='expressions to generate (default 100000)')
+    parser.add_argument('--time-limit', type=float, help='stop after this many seconds')
+    parser.add_argument('--seed', type=int, default=None, help='random seed (default: time based)')
+    parser.add_argument('--depth', type=int, default=4, help='maximum expression nesting (default 4)')
+    parser.add_argument('--show', type=int, default=10, help='mismatches to print (default 10)')
+    args = parser.parse_args(argv)
+
+    seed = args.seed if args.seed is not None else int(time.time())
+    fuzzer = DifferentialFuzzer(seed, args.depth)
+    start = time.perf_counter()
+    done = fuzzer.run(args.count, args.time_limit, progress=100000)
+    elapsed = time.perf_counter() - start
+
+    print(f"Seed {seed}: {done:,} expressions in {elapsed:.1f}s, {len(fuzzer.mismatches)} mismatches")
+    print(f"\n{'path':20} {'calls/sec':>14}")
+    for path, rate in sorted(fuzzer.throughput().items()):
+        print(f"{path:20} {rate:14,.0f}")
+
+    for mismatch in fuzzer.mismatches[:args.show]:
+        print(f"\n[{mismatch['kind']}] {mismatch['input']}")
+        if mismatch['minimized'] != mismatch['input']:
+            print(f"  minimized: {mismatch['minimized']}")
+        for problem in mismatch['problems']:
+            print(f"  {problem}")
+    return 1 if fuzzer.mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
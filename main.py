@@ -4,29 +4,69 @@ A simple calculator for feet and inches measurements with GUI interface
 """
 
 import FreeSimpleGUI as sg
-from calculator_engine import FeetInchesCalculator
+from calculator_engine import BatchTotals, DimensionModel, FeetInchesCalculator, IncrementalEvaluator
+from result_cache import ResultCache
+import os
+import sqlite3
+import queue
+import threading
+import time
 import traceback
+from collections import deque
 from datetime import datetime
 
 
+# Seconds of typing pause before the live preview is refreshed
+PREVIEW_DELAY = 0.15
+
+# Lines between progress updates when solving a pasted batch
+PROGRESS_STEP = 50
+
+# History entries kept in memory and shown; the log file keeps everything
+HISTORY_LIMIT = 500
+HISTORY_LOG = os.path.join(os.path.expanduser('~'), '.feet_inches_calculator_history.log')
+
+# Set to a path (e.g. result_cache.DEFAULT_CACHE_PATH) to keep results between sessions; None disables the cache
+RESULT_CACHE = None
+
+
 class CalculatorGUI:
     """GUI wrapper for the feet and inches calculator"""
     
-    def __init__(self):
-        self.calculator = FeetInchesCalculator()
-        self.history = []
+    def __init__(self, history_limit: int = HISTORY_LIMIT, history_log: str = HISTORY_LOG,
+                 result_cache: str = RESULT_CACHE):
+        self.result_cache = self.open_result_cache(result_cache)
+        self.calculator = FeetInchesCalculator(result_cache=self.result_cache)
+        self.preview = IncrementalEvaluator(self.calculator)
+        self.preview_due = None
+        self.history = self.load_history(history_log, history_limit)
+        self.history_shown = len(self.history)
+        self.history_file = self.open_history_log(history_log)
+        
+        # Solves run on a worker thread sharing the (thread-safe) calculator and
+        # its warm cache; a newer request bumps solve_generation, which cancels the older one
+        self.dimensions = DimensionModel(self.calculator)
+        self.solve_generation = 0
+        self.solve_requests = queue.Queue()
+        threading.Thread(target=self.solve_worker, daemon=True).start()
+        
+        # The batch panel has its own worker on the same calculator, so every line
+        # evaluates as it would in the Solve tab; evaluate_lines snaps each result
+        # to 1/64" ticks, so the totals are still summed exactly
+        self.batch_generation = 0
+        self.batch_requests = queue.Queue()
+        threading.Thread(target=self.batch_worker, daemon=True).start()
         
         # Set theme
         sg.theme('LightBlue3')
         
         # Define layout
-        self.layout = [
-            [sg.Text('Feet & Inches Calculator', font=('Arial', 16, 'bold'), justification='center')],
-            [sg.Text('')],
-            
+        calculator_tab = [
             # Main input section
             [sg.Text('Enter equation:', font=('Arial', 10))],
-            [sg.InputText(key='-INPUT-', size=(60, 1), font=('Arial', 12), focus=True)],
+            [sg.InputText(key='-INPUT-', size=(60, 1), font=('Arial', 12), focus=True, enable_events=True)],
+            [sg.Text('Preview:', font=('Arial', 9), text_color='gray'),
+             sg.Text('', key='-PREVIEW-', font=('Arial', 9), text_color='gray', size=(60, 1))],
             [sg.Button('Solve', bind_return_key=True, size=(10, 1)), 
              sg.Button('Clear Input', size=(10, 1))],
             
@@ -35,33 +75,77 @@ class CalculatorGUI:
             # Rounding section
             [sg.Text('Round to (optional):', font=('Arial', 10))],
             [sg.InputText(key='-ROUND-', size=(20, 1), font=('Arial', 12)),
-             sg.Text('Example: 1/8", 1/4", 1/2", 1"', font=('Arial', 9), text_color='gray')],
+             sg.Text('Example: 1/8", 1/4", 1/2", 1" (add up or down to round that way)', font=('Arial', 9), text_color='gray')],
             
             [sg.Text('')],
             
             # Result section
             [sg.Text('Result:', font=('Arial', 12, 'bold'))],
             [sg.Text('', key='-RESULT-', font=('Arial', 14, 'bold'), text_color='blue', size=(60, 2))],
+            [sg.ProgressBar(100, orientation='h', size=(30, 10), key='-PROGRESS-'),
+             sg.Text('', key='-STATUS-', font=('Arial', 9), text_color='gray', size=(30, 1))],
             
             [sg.Text('')],
             
             # History section
             [sg.Text('History:', font=('Arial', 12, 'bold'))],
-            [sg.Multiline('', key='-HISTORY-', size=(70, 10), font=('Arial', 10), 
+            [sg.Multiline(''.join(self.history), key='-HISTORY-', size=(70, 10), font=('Arial', 10), 
                          disabled=True, autoscroll=True, horizontal_scroll=True)],
-            [sg.Button('Clear History', size=(12, 1))],
-            [sg.Text('')],
+            [sg.Button('Clear History', size=(12, 1))]
+        ]
+        
+        batch_tab = [
+            # Paste one measurement or expression per line
+            [sg.Text('Paste one measurement or expression per line:', font=('Arial', 10))],
+            [sg.Multiline('', key='-BATCH-', size=(70, 10), font=('Arial', 10), horizontal_scroll=True)],
+            [sg.Button('Evaluate Batch', size=(14, 1)), sg.Button('Clear Batch', size=(12, 1))],
+            [sg.ProgressBar(100, orientation='h', size=(30, 10), key='-BATCH-PROGRESS-'),
+             sg.Text('', key='-BATCH-STATUS-', font=('Arial', 9), text_color='gray', size=(30, 1))],
+            [sg.Text('Totals:', font=('Arial', 12, 'bold'))],
+            [sg.Text('', key='-BATCH-TOTALS-', font=('Arial', 11), text_color='blue', size=(60, 4))],
+            [sg.Text('Results:', font=('Arial', 12, 'bold'))],
+            [sg.Multiline('', key='-BATCH-RESULTS-', size=(70, 12), font=('Arial', 10),
+                         disabled=True, horizontal_scroll=True)]
+        ]
+        
+        self.layout = [
+            [sg.Text('Feet & Inches Calculator', font=('Arial', 16, 'bold'), justification='center')],
+            [sg.TabGroup([[sg.Tab('Calculator', calculator_tab), sg.Tab('Batch', batch_tab)]])],
             [sg.Button('Exit', size=(10, 1))]
         ]
         
         # Create window
         self.window = sg.Window('Feet & Inches Calculator', self.layout, 
                                resizable=True, finalize=True, 
-                               icon=None, size=(600, 700))
+                               icon=None, size=(640, 760))
         
         # Set focus to input field
         self.window['-INPUT-'].set_focus()
     
+    def load_history(self, path: str, limit: int) -> deque:
+        """Return the last entries of the history log, streaming the file"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                return deque(f, maxlen=limit)
+        except OSError:
+            return deque(maxlen=limit)
+    
+    def open_history_log(self, path: str):
+        """Open the history log for appending, or return None if it can't be written"""
+        try:
+            return open(path, 'a', encoding='utf-8')
+        except OSError:
+            return None
+    
+    def open_result_cache(self, path: str):
+        """Open the persistent result cache, or return None if it is disabled or can't be opened"""
+        if path is None:
+            return None
+        try:
+            return ResultCache(path)
+        except (OSError, sqlite3.Error):
+            return None
+    
     def add_to_history(self, equation: str, result: str, rounded_to: str = None):
         """Add calculation to history"""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -73,49 +157,202 @@ class CalculatorGUI:
         
         self.history.append(history_entry)
         
-        # Update history display
-        history_text = ''.join(self.history)
-        self.window['-HISTORY-'].update(history_text)
+        # Append just the new line; trim the display back to the ring buffer
+        # once it holds twice the limit, so the rebuild cost is amortized
+        self.history_shown += 1
+        if self.history_shown > 2 * self.history.maxlen:
+            self.window['-HISTORY-'].update(''.join(self.history))
+            self.history_shown = len(self.history)
+        else:
+            self.window['-HISTORY-'].update(history_entry, append=True)
+        
+        if self.history_file:
+            self.history_file.write(history_entry)
+            self.history_file.flush()
     
     def solve_equation(self, equation: str, round_to: str = None):
-        """Solve the equation and update the result"""
-        try:
-            if not equation.strip():
-                self.window['-RESULT-'].update("Please enter an equation")
-                return
-            
-            # Evaluate the expression
-            result_inches = self.calculator.evaluate_expression(equation)
-            
-            # Format the result
-            if round_to and round_to.strip():
-                formatted_result = self.calculator.format_result(result_inches, round_to.strip())
-                self.add_to_history(equation, formatted_result, round_to.strip())
+        """Queue the equation for the worker thread; each pasted line is solved separately"""
+        equations = [line.strip() for line in equation.splitlines() if line.strip()]
+        if not equations:
+            self.window['-RESULT-'].update("Please enter an equation")
+            return
+        
+        self.solve_generation += 1
+        self.solve_requests.put((self.solve_generation, equations, round_to.strip() if round_to else None))
+        if len(equations) > 1:
+            self.window['-STATUS-'].update(f"Solving 0/{len(equations)}...")
+            self.window['-PROGRESS-'].update(0, max=len(equations))
+    
+    def solve_worker(self):
+        """Worker thread: solve queued requests and post results back to the event loop"""
+        calculator = self.calculator
+        # Lines like "wall = 12' 6\"" define dimensions that later lines (and later solves) can use
+        dimensions = self.dimensions
+        while True:
+            generation, equations, round_to = self.solve_requests.get()
+            total = len(equations)
+            results = []
+            for index, equation in enumerate(equations, 1):
+                # Give up as soon as a newer request has been made
+                if generation != self.solve_generation:
+                    break
+                try:
+                    if '=' in equation:
+                        result = calculator.format_result(dimensions.value(dimensions.define_line(equation)), round_to)
+                    elif len(dimensions):
+                        result = calculator.format_result(dimensions.evaluate(equation), round_to)
+                    else:
+                        result = calculator.solve(equation, round_to)[1]
+                    results.append((equation, result))
+                except Exception as e:
+                    results.append((equation, f"Error: {str(e)}"))
+                if total > 1 and index % PROGRESS_STEP == 0:
+                    self.window.write_event_value('-SOLVE-PROGRESS-', (generation, index, total))
+            else:
+                self.window.write_event_value('-SOLVED-', (generation, round_to, results))
+    
+    def show_solution(self, generation: int, round_to: str, results: list):
+        """Display results posted by the worker unless a newer request superseded them"""
+        if generation != self.solve_generation:
+            return
+        
+        for equation, formatted_result in results:
+            if round_to and not formatted_result.startswith('Error: '):
+                self.add_to_history(equation, formatted_result, round_to)
             else:
-                formatted_result = self.calculator.format_result(result_inches)
                 self.add_to_history(equation, formatted_result)
-            
-            # Update result display
-            self.window['-RESULT-'].update(formatted_result)
-            
-        except Exception as e:
-            error_msg = f"Error: {str(e)}"
-            self.window['-RESULT-'].update(error_msg)
-            self.add_to_history(equation, error_msg)
+        
+        # Update result display
+        if len(results) == 1:
+            self.window['-RESULT-'].update(results[0][1])
+            self.window['-STATUS-'].update('')
+        else:
+            errors = sum(1 for _, formatted_result in results if formatted_result.startswith('Error: '))
+            self.window['-RESULT-'].update(f"Solved {len(results)} lines ({errors} errors), see history")
+            self.window['-STATUS-'].update('Done')
+            self.window['-PROGRESS-'].update(len(results), max=len(results))
+    
+    def evaluate_batch(self, text: str, round_to: str = None):
+        """Queue the pasted lines for the batch worker"""
+        lines = [line for line in text.splitlines() if line.strip()]
+        if not lines:
+            self.window['-BATCH-STATUS-'].update("Please paste some lines")
+            return
+        
+        self.batch_generation += 1
+        self.batch_requests.put((self.batch_generation, lines, round_to.strip() if round_to else None))
+        self.window['-BATCH-STATUS-'].update(f"Evaluating 0/{len(lines)}...")
+        self.window['-BATCH-PROGRESS-'].update(0, max=len(lines))
+    
+    def batch_worker(self):
+        """Worker thread: evaluate pasted lines with exact totals and post the report"""
+        calculator = self.calculator
+        while True:
+            generation, lines, round_to = self.batch_requests.get()
+            totals = BatchTotals(calculator.resolution)
+            report = []
+            try:
+                for index, result in enumerate(calculator.evaluate_lines(lines, totals), 1):
+                    # Give up as soon as a newer batch has been pasted
+                    if generation != self.batch_generation:
+                        break
+                    if result.error:
+                        report.append(f"{result.expression} = Error: {result.error}\n")
+                    else:
+                        report.append(f"{result.expression} = {calculator.format_result(result.value, round_to)}\n")
+                    if index % PROGRESS_STEP == 0:
+                        self.window.write_event_value('-BATCH-PROGRESS-', (generation, index, len(lines)))
+                else:
+                    self.window.write_event_value('-BATCH-DONE-', (generation, round_to, totals, ''.join(report)))
+            except ValueError as e:
+                # An invalid rounding value fails every line the same way
+                self.window.write_event_value('-BATCH-DONE-', (generation, None, None, f"Error: {str(e)}\n"))
+    
+    def show_batch(self, generation: int, round_to: str, totals: BatchTotals, report: str):
+        """Display a finished batch unless a newer one superseded it"""
+        if generation != self.batch_generation:
+            return
+        
+        self.window['-BATCH-RESULTS-'].update(report)
+        self.window['-BATCH-STATUS-'].update('Done')
+        if totals is None:
+            self.window['-BATCH-TOTALS-'].update('')
+            return
+        
+        self.window['-BATCH-PROGRESS-'].update(totals.count + totals.errors, max=totals.count + totals.errors)
+        if not totals.count:
+            self.window['-BATCH-TOTALS-'].update(f"Count: 0    Errors: {totals.errors}")
+            return
+        
+        format_ticks = lambda ticks: self.calculator.format_result(ticks / totals.resolution, round_to)
+        self.window['-BATCH-TOTALS-'].update(
+            f"Total: {format_ticks(totals.total)}\n"
+            f"Count: {totals.count}    Errors: {totals.errors}\n"
+            f"Min: {format_ticks(totals.minimum)}    Max: {format_ticks(totals.maximum)}"
+            f"    Mean: {format_ticks(float(totals.mean))}")
+    
+    def update_preview(self, equation: str, round_to: str = None):
+        """Show the live result of the equation being typed"""
+        if not equation.strip():
+            self.window['-PREVIEW-'].update('')
+            return
+        try:
+            result_inches = self.preview.update(equation)
+            self.window['-PREVIEW-'].update(self.calculator.format_result(result_inches, round_to))
+        except ValueError:
+            # Half-typed expressions are expected; keep quiet until Solve
+            self.window['-PREVIEW-'].update('...')
     
     def clear_history(self):
-        """Clear the calculation history"""
-        self.history = []
+        """Clear the calculation history shown in this session (the log file is kept)"""
+        self.history.clear()
+        self.history_shown = 0
         self.window['-HISTORY-'].update('')
     
     def run(self):
         """Main event loop"""
         while True:
-            event, values = self.window.read()
+            # Poll while a preview is pending so it fires once typing pauses
+            event, values = self.window.read(timeout=50 if self.preview_due else None)
             
             if event == sg.WIN_CLOSED or event == 'Exit':
                 break
             
+            elif event == '-INPUT-':
+                self.preview_due = time.monotonic() + PREVIEW_DELAY
+            
+            elif event == '-SOLVE-PROGRESS-':
+                generation, done, total = values[event]
+                if generation == self.solve_generation:
+                    self.window['-PROGRESS-'].update(done, max=total)
+                    self.window['-STATUS-'].update(f"Solving {done}/{total}...")
+            
+            elif event == '-SOLVED-':
+                self.show_solution(*values[event])
+            
+            elif event == 'Evaluate Batch':
+                self.evaluate_batch(values['-BATCH-'], values['-ROUND-'])
+            
+            elif event == 'Clear Batch':
+                self.batch_generation += 1
+                for key in ('-BATCH-', '-BATCH-RESULTS-', '-BATCH-TOTALS-', '-BATCH-STATUS-'):
+                    self.window[key].update('')
+                self.window['-BATCH-PROGRESS-'].update(0)
+            
+            elif event == '-BATCH-PROGRESS-':
+                generation, done, total = values[event]
+                if generation == self.batch_generation:
+                    self.window['-BATCH-PROGRESS-'].update(done, max=total)
+                    self.window['-BATCH-STATUS-'].update(f"Evaluating {done}/{total}...")
+            
+            elif event == '-BATCH-DONE-':
+                self.show_batch(*values[event])
+            
+            elif event == sg.TIMEOUT_KEY:
+                if self.preview_due and time.monotonic() >= self.preview_due:
+                    self.preview_due = None
+                    self.update_preview(values['-INPUT-'], values['-ROUND-'])
+            
             elif event == 'Solve':
                 equation = values['-INPUT-']
                 round_to = values['-ROUND-']
@@ -124,12 +361,18 @@ class CalculatorGUI:
             elif event == 'Clear Input':
                 self.window['-INPUT-'].update('')
                 self.window['-RESULT-'].update('')
+                self.window['-PREVIEW-'].update('')
+                self.preview_due = None
                 self.window['-INPUT-'].set_focus()
             
             elif event == 'Clear History':
                 self.clear_history()
         
         self.window.close()
+        if self.history_file:
+            self.history_file.close()
+        if self.result_cache:
+            self.result_cache.close()
 
 
 def main():
@@ -0,0 +1,173 @@
+"""
+Persistent result cache for the calculator engine
+Stores evaluated expressions in a local SQLite file (WAL mode) so results are
+reused across sessions and by several processes at once. Keys are hashed
+together with the cache format version, so bumping CACHE_VERSION when engine
+semantics change makes old entries unreachable; they are purged the next time
+the file is opened.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+
+# Bump when evaluation or formatting results change for the same input
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.feet_inches_calculator_cache.sqlite')
+
+# Seconds before a hit refreshes an entry's last-used time, so warm runs stay read-only
+TOUCH_INTERVAL = 3600
+
+
+class ResultCacheInfo(NamedTuple):
+    """Statistics for a ResultCache"""
+    hits: int
+    misses: int
+    entries: int
+    max_entries: int
+
+
+class ResultCache:
+    """A size-bounded, versioned key -> (value, result, error) store in SQLite.
+
+    Reads go straight to the database; writes and last-used updates are
+    buffered and written in one transaction every flush_every changes (and
+    on flush() or close()). When the table grows past max_entries the least
+    recently used tenth is evicted. Safe to share between threads; once
+    closed, lookups miss and writes are dropped.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 1_000_000,
+                 version: int = CACHE_VERSION, flush_every: int = 512):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.path = path
+        self.max_entries = max_entries
+        self.version = version
+        self.flush_every = flush_every
+        self._salt = f"v{version}|".encode()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._touched = set()
+        self._hits = 0
+        self._misses = 0
+
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        execute = self._connection.execute
+        execute("PRAGMA journal_mode=WAL")
+        execute("PRAGMA synchronous=NORMAL")
+        execute("PRAGMA cache_size=-32768")
+        execute("CREATE TABLE IF NOT EXISTS results "
+                "(key BLOB PRIMARY KEY, value, result TEXT, error TEXT, used INTEGER) WITHOUT ROWID")
+        execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)")
+        row = execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        if row is None or row[0] != version:
+            with self._transaction():
+                execute("DELETE FROM results")
+                execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,))
+        self._entries = execute("SELECT count(*) FROM results").fetchone()[0]
+
+    def get(self, key: str):
+        """Return (value, result, error) for a key, or None if it is not cached"""
+        key = self._digest(key)
+        with self._lock:
+            if self._connection is None:
+                return None
+            row = self._pending.get(key)
+            if row is None:
+                row = self._connection.execute(
+                    "SELECT value, result, error, used FROM results WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self._misses += 1
+                    return None
+                if row[3] < time.time() - TOUCH_INTERVAL:
+                    self._touched.add(key)
+                    if len(self._touched) >= self.flush_every:
+                        self._flush()
+                row = row[:3]
+            self._hits += 1
+            return row
+
+    def put(self, key: str, value=None, result: str = None, error: str = None):
+        """Cache a value (inches or ticks), formatted result and/or error message for a key"""
+        with self._lock:
+            if self._connection is None:
+                return
+            self._pending[self._digest(key)] = (value, result, error)
+            if len(self._pending) >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        """Write buffered entries and last-used times to the database"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._connection is None or not self._pending and not self._touched:
+            return
+        now = int(time.time())
+        execute = self._connection.execute
+        with self._transaction():
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                [(key, value, result, error, now) for key, (value, result, error) in self._pending.items()])
+            self._connection.executemany(
+                "UPDATE results SET used = ? WHERE key = ?", [(now, key) for key in self._touched])
+            self._entries += len(self._pending)
+            if self._entries > self.max_entries:
+                self._entries = execute("SELECT count(*) FROM results").fetchone()[0]
+                excess = self._entries - self.max_entries * 9 // 10
+                if self._entries > self.max_entries and excess > 0:
+                    execute("DELETE FROM results WHERE key IN "
+                            "(SELECT key FROM results ORDER BY used LIMIT ?)", (excess,))
+                    self._entries -= excess
+        self._pending.clear()
+        self._touched.clear()
+
+    def _digest(self, key: str) -> bytes:
+        """Fixed-size database key for a versioned cache key"""
+        return hashlib.blake2b(self._salt + key.encode(), digest_size=16).digest()
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, rolled back on error"""
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def info(self) -> ResultCacheInfo:
+        with self._lock:
+            return ResultCacheInfo(self._hits, self._misses, self._entries + len(self._pending), self.max_entries)
+
+    def clear(self):
+        """Remove every entry, including ones written by other processes"""
+        with self._lock:
+            self._pending.clear()
+            self._touched.clear()
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM results")
+            self._entries = 0
+            self._hits = self._misses = 0
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._flush()
+                self._connection.close()
+                self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,366 @@
+"""
+Local HTTP/JSON evaluation service
+Serves the calculator engine over loopback with keep-alive connections.
+Concurrent /evaluate requests are coalesced into micro-batches that are
+evaluated together off the event loop.
+
+Endpoints (all POST with a JSON body except /stats):
+    /evaluate  {"expression": "10' + 6\"", "round_to": "1/8\""}
+    /format    {"inches": 126.5, "round_to": "1/8\"", "denominator": 16}
+    /batch     {"expressions": ["10' + 6\"", ...], "round_to": "1/8\""}
+    /stats     latency histograms per endpoint and micro-batch sizes
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from calculator_engine import FeetInchesCalculator, _gil_enabled
+
+MAX_BODY = 16 * 1024 * 1024
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            411: 'Length Required', 413: 'Payload Too Large'}
+_ENDPOINTS = ('/evaluate', '/format', '/batch', '/stats')
+
+
+class LatencyHistogram:
+    """Request latencies bucketed by powers of two microseconds"""
+    __slots__ = ('buckets', 'count', 'total', 'maximum')
+    unit = 'us'
+    scale = 1e6  # recorded seconds to microseconds
+
+    def __init__(self):
+        self.buckets = [0] * 32
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, value: float):
+        value *= self.scale
+        self.buckets[min(31, self._bucket(value))] += 1
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    @staticmethod
+    def _bucket(value: float) -> int:
+        return int(value).bit_length()
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound, in the histogram's unit, of the bucket holding the given percentile"""
+        wanted = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return float(1 << index)
+        return 0.0
+
+    def snapshot(self) -> dict:
+        unit = self.unit
+        suffix = f'_{unit}' if unit else ''
+        return {
+            'count': self.count,
+            'mean' + suffix: self.total / self.count if self.count else 0.0,
+            'p50' + suffix: self.percentile(0.50),
+            'p99' + suffix: self.percentile(0.99),
+            'max' + suffix: self.maximum,
+            # "<=N unit": count, for non-empty buckets only
+            'buckets': {f'<={1 << index}{unit}': count for index, count in enumerate(self.buckets) if count},
+        }
+
+
+class BatchSizeHistogram(LatencyHistogram):
+    """Micro-batch sizes bucketed by powers of two requests"""
+    __slots__ = ()
+    unit = ''
+    scale = 1
+
+    @staticmethod
+    def _bucket(size: int) -> int:
+        # A batch of n requests lands in the bucket labelled <= n rounded up to a power of two
+        return (int(size) - 1).bit_length()
+
+
+def _check_options(request: dict):
+    """Reject formatting options of the wrong type before they reach the engine"""
+    round_to = request.get('round_to')
+    if round_to is not None and not isinstance(round_to, str):
+        raise ValueError("round_to must be a string or null")
+    denominator = request.get('denominator')
+    if denominator is not None and (isinstance(denominator, bool) or not isinstance(denominator, int)):
+        raise ValueError("denominator must be an integer or null")
+
+
+class EvaluationServer:
+    """asyncio HTTP/1.1 server around a single shared FeetInchesCalculator"""
+
+    def __init__(self, calculator: FeetInchesCalculator = None, host: str = '127.0.0.1', port: int = 8765,
+                 max_batch: int = 256, max_delay: float = 0.001, threads: int = None):
+        try:
+            loopback = host == 'localhost' or ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            loopback = False
+        if not loopback:
+            raise ValueError(f"Refusing to listen on non-loopback address: {host}")
+        self.calculator = calculator or FeetInchesCalculator()
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.latency = {}
+        self.batch_sizes = BatchSizeHistogram()
+        self._pending = None
+        self._server = None
+        self._batcher = None
+        # Engine threads share the one calculator. More than one only helps on
+        # free-threaded builds, so that is the only place it is the default.
+        self.threads = threads or (1 if _gil_enabled() else os.cpu_count() or 1)
+        self._executor = None
+        self._slots = None
+        self._running = set()
+
+    async def start(self) -> int:
+        """Start listening; returns the bound port (useful with port=0)"""
+        self._pending = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='calculator')
+        self._slots = asyncio.Semaphore(self.threads)
+        self._batcher = asyncio.create_task(self._run_batches())
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader, writer):
+        """Serve requests on one connection until the client closes it"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = time.perf_counter()
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'Malformed request line'}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                body = b''
+                if 'content-length' in headers:
+                    try:
+                        length = int(headers['content-length'])
+                    except ValueError:
+                        length = -1
+                    if length < 0:
+                        await self._respond(writer, 400, {'error': 'Invalid Content-Length'}, False)
+                        break
+                    if length > MAX_BODY:
+                        await self._respond(writer, 413, {'error': 'Request body too large'}, False)
+                        break
+                    body = await reader.readexactly(length)
+                elif method == 'POST':
+                    await self._respond(writer, 411, {'error': 'Content-Length required'}, False)
+                    break
+
+                path = path.split('?', 1)[0]
+                status, payload = await self._dispatch(method, path, body)
+                await self._respond(writer, status, payload, keep_alive)
+                # Unknown paths share one histogram so stray requests cannot grow the table
+                key = path if path in _ENDPOINTS else 'other'
+                self.latency.setdefault(key, LatencyHistogram()).record(time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status: int, payload: dict, keep_alive: bool):
+        body = json.dumps(payload).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> tuple[int, dict]:
+        if path == '/stats':
+            return 200, self.stats()
+        if path not in _ENDPOINTS:
+            return 404, {'error': f"Unknown endpoint: {path}"}
+        if method != 'POST':
+            return 405, {'error': f"{path} requires POST"}
+        try:
+            request = json.loads(body or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError("Request body must be a JSON object")
+            if path == '/evaluate':
+                return await self._evaluate(request)
+            if path == '/format':
+                return self._format(request)
+            return await self._batch(request)
+        except (ValueError, TypeError, KeyError, OverflowError) as e:
+            # json.JSONDecodeError is a ValueError too
+            return 400, {'error': str(e) if not isinstance(e, KeyError) else f"Missing field: {e}"}
+
+    async def _evaluate(self, request: dict) -> tuple[int, dict]:
+        _check_options(request)
+        future = asyncio.get_running_loop().create_future()
+        await self._pending.put((str(request['expression']), request.get('round_to'), future))
+        result = await future
+        return (400 if 'error' in result else 200), result
+
+    def _format(self, request: dict) -> tuple[int, dict]:
+        _check_options(request)
+        inches = request['inches']
+        if isinstance(inches, bool) or not isinstance(inches, (int, float)) or not math.isfinite(inches):
+            raise ValueError("inches must be a finite number")
+        result = self.calculator.format_result(float(inches), request.get('round_to'), request.get('denominator'))
+        return 200, {'result': result}
+
+    async def _batch(self, request: dict) -> tuple[int, dict]:
+        _check_options(request)
+        expressions = request['expressions']
+        if not isinstance(expressions, list):
+            raise ValueError("expressions must be a list")
+        items = [(str(expression), request.get('round_to')) for expression in expressions]
+        results = await asyncio.get_running_loop().run_in_executor(self._executor, self._evaluate_all, items)
+        return 200, {'results': results}
+
+    async def _run_batches(self):
+        """Collect queued /evaluate requests into micro-batches and evaluate each in one executor call"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._pending.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._pending.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._pending.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batch_sizes.record(len(batch))
+            # Wait for a free engine thread; requests keep queueing meanwhile,
+            # so the next batch grows while every thread is busy
+            await self._slots.acquire()
+            task = asyncio.create_task(self._finish_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _finish_batch(self, batch: list):
+        """Evaluate one micro-batch on an engine thread and answer its requests"""
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._evaluate_all, [(expression, round_to) for expression, round_to, _ in batch])
+        except Exception as e:
+            results = [{'error': f"Calculation Error: {str(e)}"}] * len(batch)
+        finally:
+            self._slots.release()
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _evaluate_all(self, items: list) -> list[dict]:
+        """Evaluate (expression, round_to) pairs, computing repeated pairs only once.
+
+        A failing item gets its own error result and never affects the others.
+        """
+        calculator = self.calculator
+        seen = {}
+        results = []
+        for item in items:
+            result = seen.get(item)
+            if result is None:
+                expression, round_to = item
+                try:
+                    inches = calculator.evaluate_expression(expression)
+                    result = {'expression': expression, 'inches': inches,
+                              'result': calculator.format_result(inches, round_to)}
+                except ValueError as e:
+                    result = {'expression': expression, 'error': str(e)}
+                except Exception as e:
+                    result = {'expression': expression, 'error': f"Calculation Error: {str(e)}"}
+                seen[item] = result
+            results.append(result)
+        return results
+
+    def stats(self) -> dict:
+        return {
+            'latency': {path: histogram.snapshot() for path, histogram in self.latency.items()},
+            'batch_sizes': self.batch_sizes.snapshot(),
+            'cache': self.calculator.cache_info()._asdict(),
+        }
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Serve the feet and inches calculator over local HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='loopback address to bind (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on (default 8765)')
+    parser.add_argument('--max-batch', type=int, default=256, help='largest /evaluate micro-batch (default 256)')
+    parser.add_argument('--max-delay', type=float, default=0.001,
+                        help='seconds to wait for a micro-batch to fill (default 0.001)')
+    parser.add_argument('--threads', type=int, help='engine threads (default 1, or one per CPU without the GIL)')
+    parser.add_argument('--exact', action='store_true', help='use exact integer 1/64" arithmetic')
+    args = parser.parse_args(argv)
+
+    try:
+        server = EvaluationServer(FeetInchesCalculator(exact=args.exact), args.host, args.port,
+                                  args.max_batch, args.max_delay, args.threads)
+    except ValueError as e:
+        parser.error(str(e))
+
+    async def serve():
+        port = await server.start()
+        print(f"Listening on http://{server.host}:{port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,11 +7,34 @@ This file contains all tests to ensure mathematical accuracy and proper formatti
 import unittest
 import sys
 import os
+import io
+import itertools
+import asyncio
+import http.client
+import json
+import pickle
+import random
+import tempfile
+import threading
+from fractions import Fraction
+from contextlib import redirect_stdout, redirect_stderr
 
 # Add the current directory to the path so we can import calculator_engine
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from calculator_engine import FeetInchesCalculator
+import benchmark
+import calculator_engine
+import cut_optimizer
+import fuzz_calculator
+import server
+from result_cache import ResultCache
+from calculator_engine import (BatchTotals, DimensionModel, FeetInchesCalculator, IncrementalEvaluator, Measurement,
+                               MeasurementArray, evaluate_parallel, load_measurements)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class TestFeetInchesCalculator(unittest.TestCase):
@@ -293,6 +316,728 @@ class TestFeetInchesCalculator(unittest.TestCase):
                 result = self.calc.evaluate_expression(expression)
                 self.assertAlmostEqual(result, expected, places=6)
 
+    def test_tokenizer(self):
+        """Test that the tokenizer emits typed tokens in a single scan"""
+        tokens = self.calc.tokenize("(1' 2 3/4\" + 6\") x 2")
+        self.assertEqual([token.kind for token in tokens],
+                         ['lparen', 'measure', 'op', 'measure', 'rparen', 'op', 'number'])
+        self.assertAlmostEqual(tokens[1].value, 14.75, places=6)
+        self.assertEqual(tokens[5].value, '*')
+        self.assertEqual(tokens[5].start, 17)
+
+    def test_alternate_operators_and_unary_minus(self):
+        """Test x, X and ÷ operators, decimal inches and unary minus"""
+        test_cases = [
+            ("3' x 2", 72.0),
+            ("2 X 3'", 72.0),
+            ("3' ÷ 2", 18.0),
+            ('6.5" + 1"', 7.5),
+            ("-(1' + 2\")", -14.0),
+            ("2' * -3", -72.0),
+            ("(2) * 3'", 72.0),
+            ("2' * (-3)", -72.0),
+            ('(' * 200 + '1"' + ')' * 200, 1.0),
+        ]
+        for expression, expected in test_cases:
+            with self.subTest(expression=expression):
+                result = self.calc.evaluate_expression(expression)
+                self.assertAlmostEqual(result, expected, places=6)
+
+    def test_syntax_error_messages(self):
+        """Test that syntax errors produce helpful messages"""
+        test_cases = [
+            ("(1' + 2'", "Unmatched parentheses"),
+            ("1' + 2')", "Unmatched parentheses"),
+            ('1/2 + 1\'', "without inches"),
+            ('1/0"', "denominator cannot be zero"),
+            ('12" / 0', "division by zero"),
+            ("2 * (3 + 1')", "Found number '3'"),  # parentheses do not make 3 a multiplier
+        ]
+        for expression, message in test_cases:
+            with self.subTest(expression=expression):
+                with self.assertRaisesRegex(ValueError, message):
+                    self.calc.evaluate_expression(expression)
+
+    def test_expression_cache(self):
+        """Test the LRU cache of compiled expressions"""
+        calc = FeetInchesCalculator(cache_size=2)
+        calc.evaluate_expression("1' x 2")
+        calc.evaluate_expression("1'  *   2")  # same normalized form
+        self.assertEqual(calc.cache_info().hits, 1)
+        self.assertEqual(calc.cache_info().misses, 1)
+
+        calc.evaluate_expression("2' + 1\"")
+        calc.evaluate_expression("3' ÷ 2")
+        info = calc.cache_info()
+        self.assertEqual((info.evictions, info.currsize, info.maxsize), (1, 2, 2))
+
+        # 2÷3" divides by three inches; it must not share a key with the fraction 2/3"
+        self.assertNotEqual(calc.normalize_expression('2÷3"'), calc.normalize_expression('2/3"'))
+
+        calc.cache_clear()
+        self.assertEqual(calc.cache_info(), (0, 0, 0, 2, 0))
+
+    def test_exact_mode(self):
+        """Test fixed-point evaluation in integer 1/64" ticks"""
+        calc = FeetInchesCalculator(exact=True)
+        test_cases = [
+            ("1' + 1/64\"", 769, "1' 1/64\""),
+            ("10' 11 1/2\" + 5' 10 1/8\"", 12904, "16' 9 5/8\""),
+            ("16' - 2 * 1 1/2\"", 12096, "15' 9\""),
+            ('1" / 3', 21, '21/64"'),  # 21.33 ticks rounds to nearest
+            ('-1/64" / 2', -1, '-1/64"'),  # ties round away from zero
+            ("2' / 6\" * 1\"", 256, '4"'),  # length / length is a plain number
+        ]
+        for expression, ticks, formatted in test_cases:
+            with self.subTest(expression=expression):
+                self.assertEqual(calc.evaluate_ticks(expression), ticks)
+                self.assertEqual(calc.format_ticks(ticks), formatted)
+                self.assertEqual(calc.evaluate_expression(expression), ticks / 64)
+
+        # A long chain of additions stays exact
+        chain = ' + '.join(['0 1/64"', '3/32"'] * 500)
+        self.assertEqual(calc.evaluate_ticks(chain), 3500)
+
+        with self.assertRaises(ValueError):
+            calc.evaluate_ticks("2' * 2'")
+
+    def test_formatting_denominators_and_batches(self):
+        """Test configurable formatting denominators and format_many"""
+        test_cases = [
+            (8, 1.0 / 3, '3/8"'),
+            (16, 18.75, "1' 6 3/4\""),
+            (64, 11.999, "1'"),  # snaps up without producing 12"
+            (128, 0.1171875, '15/128"'),
+            (64, -0.001, '0"'),
+        ]
+        for denominator, inches, expected in test_cases:
+            with self.subTest(denominator=denominator, inches=inches):
+                self.assertEqual(self.calc.format_result(inches, denominator=denominator), expected)
+
+        values = [0.0, 0.5, -12.5, 18.75, 24.0]
+        self.assertEqual(self.calc.format_many(values), [self.calc.format_result(v) for v in values])
+        self.assertEqual(FeetInchesCalculator(denominator=8).format_many([1.0 / 16]), ['1/8"'])
+
+        with self.assertRaises(ValueError):
+            self.calc.format_result(1.0, denominator=10)
+
+    def test_rounding(self):
+        """Test that round_to rounds results using a compiled rounding spec"""
+        test_cases = [
+            (1.06, '1/8"', '1"'),
+            (1.06, '1/8" up', '1 1/8"'),
+            (-1.06, '1/8" down', '-1 1/8"'),
+            (12.49, '1"', "1'"),
+            (12.5, '1"', "1' 1\""),  # halves round away from zero
+            (1.0625, '1/4"', '1"'),
+            (18.8, '1/16"', "1' 6 13/16\""),
+        ]
+        for inches, round_to, expected in test_cases:
+            with self.subTest(inches=inches, round_to=round_to):
+                self.assertEqual(self.calc.format_result(inches, round_to), expected)
+
+        spec = self.calc.compile_rounding('1/8" up')
+        self.assertIs(self.calc.compile_rounding('1/8" up'), spec)
+        self.assertEqual(spec.mode, 'ceil')
+        self.assertEqual(spec.apply_ticks(5, 64), 8)
+        self.assertEqual(self.calc.format_many([1.06, 2.01], spec), ['1 1/8"', '2 1/8"'])
+        self.assertEqual(self.calc.format_result(1.06, ''), '1 1/16"')
+
+        for invalid in ['abc', '0"', '1/0"']:
+            with self.subTest(round_to=invalid):
+                with self.assertRaises(ValueError):
+                    self.calc.format_result(1.0, invalid)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_evaluate_batch(self):
+        """Test vectorized evaluation of a template over columns"""
+        result = self.calc.evaluate_batch('A + B - 3/4" x 2', {
+            'A': ["10' 2 1/2\"", '3/4"', "5'"],
+            'B': [1.0, 2.0, 0.5],
+        })
+        expected = [self.calc.evaluate_expression(e) for e in
+                    ["10' 2 1/2\" + 1\" - 3/4\" x 2", '3/4" + 2" - 3/4" x 2', "5' + 1/2\" - 3/4\" x 2"]]
+        self.assertEqual(result.tolist(), expected)
+
+        # Names may contain x without being read as the times operator
+        self.assertEqual(self.calc.evaluate_batch('box x 2', {'box': [1.5]}).tolist(), [3.0])
+        self.assertEqual(self.calc.normalize_expression('box x 2'), 'box * 2')
+
+        with self.assertRaises(ValueError):
+            self.calc.evaluate_batch('A + B', {'A': [1.0]})
+        with self.assertRaises(ValueError):
+            self.calc.evaluate_expression('A + 1"')  # names are only allowed in templates
+        with self.assertRaises(ValueError):
+            self.calc.evaluate_batch('x1 + 1"', {'x1': [1.0]})  # x1 lexes as x then 1
+
+    def test_evaluate_parallel(self):
+        """Test process-pool evaluation keeps input order and per-row errors"""
+        expressions = ["1' + %d\"" % i for i in range(50)] + ['10 11', "2' / 2"]
+        results = list(evaluate_parallel(expressions, workers=2, chunk_size=7))
+        self.assertEqual([r.expression for r in results], expressions)
+        self.assertEqual([r.value for r in results[:50]], [12.0 + i for i in range(50)])
+        self.assertIsNone(results[50].value)
+        self.assertIn("Found number '10'", results[50].error)
+        self.assertEqual((results[51].value, results[51].error), (12.0, None))
+
+    def test_command_line(self):
+        """Test the headless command line entry point"""
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+            f.write("1' + 6\"\n\n10 11\n1/3\" * 1\n")
+        self.addCleanup(os.remove, f.name)
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            status = calculator_engine.main([f.name, '--round-to', '1/8"'])
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(status, 1)
+        self.assertEqual(lines[0], "1' 6\"")
+        self.assertEqual(lines[1], '')
+        self.assertTrue(lines[2].startswith('Error: Format Error'))
+        self.assertEqual(lines[3], '3/8"')
+        self.assertIn(':3:', stderr.getvalue())
+
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            status = calculator_engine.main([f.name, '--json'])
+        records = [json.loads(line) for line in stdout.getvalue().splitlines() if line]
+        self.assertEqual(records[0], {'line': 1, 'expression': "1' + 6\"", 'inches': 18.0, 'result': "1' 6\""})
+        self.assertEqual(records[1]['line'], 3)
+        self.assertIn('error', records[1])
+
+        # A file that cannot be opened is reported and the remaining files still run
+        missing = f.name + '.missing'
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            status = calculator_engine.main([missing, f.name])
+        self.assertEqual(status, 1)
+        self.assertTrue(stderr.getvalue().startswith(f'{missing}: '))
+        self.assertEqual(stdout.getvalue().splitlines()[0], "1' 6\"")
+
+    def test_benchmark_baseline_comparison(self):
+        """Test that the benchmark flags stages slower than the baseline threshold"""
+        corpora = benchmark.build_corpora(size=20)
+        self.assertEqual(set(corpora), {'short', 'long_chains', 'nested', 'errors', 'measurements'})
+        for expression in corpora['short'] + corpora['long_chains'] + corpora['nested']:
+            self.calc.evaluate_expression(expression)  # valid corpora must evaluate
+
+        baseline = {'short/evaluate': {'ops_per_sec': 1000.0}, 'nested/evaluate': {'ops_per_sec': 1000.0}}
+        results = {'short/evaluate': {'ops_per_sec': 700.0}, 'nested/evaluate': {'ops_per_sec': 900.0}}
+        regressions = benchmark.compare_to_baseline(results, baseline, threshold=0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('short/evaluate'))
+
+    def test_profiling(self):
+        """Test opt-in per-stage timing"""
+        self.assertEqual(self.calc.profile_stats(), {})
+        self.calc.enable_profiling()
+        for expression in ["1' + 2\"", "1' + 2\"", '10 11']:
+            try:
+                self.calc.format_result(self.calc.evaluate_expression(expression))
+            except ValueError:
+                pass
+
+        stats = self.calc.profile_stats()
+        self.assertEqual(stats['normalize']['calls'], 3)
+        self.assertEqual(stats['tokenize']['calls'], 2)  # second call is a cache hit
+        self.assertEqual(stats['compile']['calls'], 1)
+        self.assertEqual(stats['run']['calls'], 2)
+        self.assertEqual(stats['format']['calls'], 2)
+        self.assertGreaterEqual(stats['run']['total_ns'], stats['run']['max_ns'])
+
+        self.calc.reset_profile()
+        self.assertEqual(self.calc.profile_stats(), {})
+        self.calc.disable_profiling()
+        self.calc.evaluate_expression("1'")
+        self.assertEqual(self.calc.profile_stats(), {})
+
+    def test_incremental_evaluation(self):
+        """Test live re-evaluation while an expression is typed and edited"""
+        live = IncrementalEvaluator(FeetInchesCalculator())
+        typed = "10' 2 1/2\" + 3/4\" x 2 - (1' + 6\")"
+        edits = [typed[:i] for i in range(1, len(typed) + 1)]
+        edits += [typed.replace('3/4', '5/8'), typed.replace("10'", "12'"), typed[:10], typed,
+                  "1' + 2\" 3\" - (4\"", "1' + 2\" 3\" - 4\"", "1' + 2\" / 0", '1" / 0 + 1" *']
+        for text in edits:
+            with self.subTest(text=text):
+                try:
+                    expected = self.calc.evaluate_expression(text)
+                except ValueError as e:
+                    with self.assertRaises(ValueError) as raised:
+                        live.update(text)
+                    self.assertEqual(str(raised.exception), str(e))
+                    continue
+                self.assertAlmostEqual(live.update(text), expected, places=9)
+                self.assertEqual(live.tokens, self.calc.tokenize(text))
+
+        # A syntax error in a later term outranks a calculation error in an earlier one
+        exact = FeetInchesCalculator(exact=True)
+        for text in ('1" / 0 + 1" *', '+2/+2"+3/'):
+            with self.subTest(text=text, exact=True):
+                with self.assertRaises(ValueError) as expected:
+                    exact.evaluate_expression(text)
+                with self.assertRaises(ValueError) as raised:
+                    IncrementalEvaluator(exact).update(text)
+                self.assertEqual(str(raised.exception), str(expected.exception))
+
+        # A measurement directly followed by digits is not an empty measurement
+        self.assertEqual([t.kind for t in self.calc.tokenize('3/4"43 * 2')], ['measure', 'number', 'op', 'number'])
+
+    def test_evaluate_lines_with_exact_totals(self):
+        """Test line-by-line batch evaluation with exact running totals"""
+        calc = FeetInchesCalculator(exact=True)
+        totals = BatchTotals()
+        lines = ['1/64"', '', "2' 6\" + 1/3\"", '10 11'] + ['0.1"'] * 1000
+        results = list(calc.evaluate_lines(lines, totals))
+        self.assertEqual(len(results), 1003)
+        self.assertEqual(results[0].value, 1 / 64)
+        self.assertIsNotNone(results[2].error)
+        self.assertEqual((totals.count, totals.errors), (1002, 1))
+        # 1/3" and 0.1" each snap to the nearest 1/64" before summing
+        self.assertEqual(totals.total, 1 + (30 * 64 + 21) + 6 * 1000)
+        self.assertEqual((totals.minimum, totals.maximum), (1, 30 * 64 + 21))
+
+    def test_evaluation_server(self):
+        """Test the loopback HTTP service: keep-alive, micro-batching and stats"""
+        def post(connection, path, payload):
+            connection.request('POST', path, json.dumps(payload), {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            return response.status, json.loads(response.read())
+
+        def client(port):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            replies = [
+                post(connection, '/evaluate', {'expression': "10' + 6\"", 'round_to': '1/8"'}),
+                post(connection, '/evaluate', {'expression': '10 11'}),
+                post(connection, '/format', {'inches': 12.375, 'denominator': 8}),
+                post(connection, '/batch', {'expressions': ["1' x 2", '1/0"']}),
+                post(connection, '/nowhere', {}),
+            ]
+            connection.request('GET', '/stats')
+            replies.append(json.loads(connection.getresponse().read()))
+            connection.close()
+            return replies
+
+        async def scenario():
+            app = server.EvaluationServer(port=0, max_delay=0.01)
+            port = await app.start()
+            loop = asyncio.get_running_loop()
+            try:
+                # Concurrent single requests are coalesced into one batch
+                concurrent = [loop.run_in_executor(None, lambda i=i: post(
+                    http.client.HTTPConnection('127.0.0.1', port, timeout=5), '/evaluate',
+                    {'expression': f"1' + {i}\""})) for i in range(8)]
+                return await asyncio.gather(*concurrent), await loop.run_in_executor(None, client, port), app
+            finally:
+                await app.close()
+
+        concurrent, replies, app = asyncio.run(scenario())
+        self.assertEqual([body['inches'] for _, body in concurrent], [12.0 + i for i in range(8)])
+        self.assertEqual(replies[0], (200, {'expression': "10' + 6\"", 'inches': 126.0, 'result': "10' 6\""}))
+        self.assertEqual(replies[1][0], 400)
+        self.assertIn("Found number '10'", replies[1][1]['error'])
+        self.assertEqual(replies[2], (200, {'result': "1' 3/8\""}))
+        status, body = replies[3]
+        self.assertEqual(status, 200)
+        self.assertEqual(body['results'][0]['result'], "2'")
+        self.assertIn('error', body['results'][1])
+        self.assertEqual(replies[4][0], 404)
+        self.assertEqual(replies[5]['latency']['/evaluate']['count'], 10)
+        self.assertLess(app.batch_sizes.count, 10)
+        sizes = app.stats()['batch_sizes']
+        self.assertEqual(sum(sizes['buckets'].values()), sizes['count'])
+        self.assertNotIn('mean_us', sizes)  # sizes are counted in requests, not microseconds
+        self.assertGreaterEqual(sizes['max'], 1)
+
+        with self.assertRaises(ValueError):
+            server.EvaluationServer(host='0.0.0.0')
+
+    def test_evaluation_server_malformed_requests(self):
+        """Test that bad payloads get a 400 of their own and never break other requests"""
+        def post(port, path, payload):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('POST', path, json.dumps(payload), {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            reply = response.status, json.loads(response.read())
+            connection.close()
+            return reply
+
+        def raw(port, content_length):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.putrequest('POST', '/evaluate')
+            connection.putheader('Content-Length', content_length)
+            connection.endheaders()
+            response = connection.getresponse()
+            reply = response.status, json.loads(response.read())
+            connection.close()
+            return reply
+
+        async def scenario():
+            app = server.EvaluationServer(port=0, max_delay=0.05)
+            port = await app.start()
+            loop = asyncio.get_running_loop()
+            call = lambda function, *args: loop.run_in_executor(None, function, port, *args)
+            try:
+                # A bad request coalesced with good ones only fails itself
+                coalesced = await asyncio.gather(
+                    call(post, '/evaluate', {'expression': "1'"}),
+                    call(post, '/evaluate', {'expression': "2'", 'round_to': 3}),
+                    call(post, '/evaluate', {'expression': "3'", 'round_to': ['1/8"']}),
+                    call(post, '/evaluate', {'expression': "4'"}))
+                malformed = [
+                    await call(post, '/format', {'inches': 1, 'round_to': 3}),
+                    await call(post, '/format', {'inches': 1e400}),
+                    await call(post, '/format', {'inches': 'abc'}),
+                    await call(post, '/format', {'inches': 1, 'denominator': '8'}),
+                    await call(post, '/batch', {'expressions': ["1'"], 'round_to': {}}),
+                    await call(raw, 'abc'),
+                    await call(raw, '-5'),
+                ]
+                return coalesced, malformed
+            finally:
+                await app.close()
+
+        coalesced, malformed = asyncio.run(scenario())
+        self.assertEqual([status for status, _ in coalesced], [200, 400, 400, 200])
+        self.assertEqual((coalesced[0][1]['inches'], coalesced[3][1]['inches']), (12.0, 48.0))
+        self.assertIn('round_to', coalesced[1][1]['error'])
+        for status, body in malformed:
+            with self.subTest(body=body):
+                self.assertEqual(status, 400)
+                self.assertIn('error', body)
+
+    def test_measurement_values(self):
+        """Test the immutable Measurement type and the packed MeasurementArray"""
+        wall = Measurement("10' 2 1/2\"")
+        self.assertEqual(wall.ticks, 122.5 * 64)
+        self.assertEqual(str(wall + Measurement('3/4"')), "10' 3 1/4\"")
+        self.assertEqual(str(wall - 2 * Measurement("1'")), "8' 2 1/2\"")
+        self.assertEqual(str(wall / 3), "3' 4 53/64\"")
+        self.assertEqual(wall / Measurement('1"'), 122.5)
+        self.assertEqual(Measurement(1.5), Measurement('1 1/2"'))
+        self.assertLess(-wall, Measurement(0))
+        self.assertEqual(pickle.loads(pickle.dumps(wall)), wall)
+        with self.assertRaises(AttributeError):
+            wall.extra = 1
+        with self.assertRaises(ValueError):
+            Measurement('10 feet')
+
+        pieces = MeasurementArray(["2'", '3/4"', 5, wall])
+        pieces.append("1' 1/64\"")
+        pieces.sort(reverse=True)
+        self.assertEqual(pieces.ticks.typecode, 'q')
+        self.assertEqual([str(piece) for piece in pieces], ["10' 2 1/2\"", "2'", "1' 1/64\"", '5"', '3/4"'])
+        self.assertEqual(str(pieces.sum()), "13' 8 17/64\"")
+        self.assertEqual((str(pieces.min()), str(pieces.max())), ('3/4"', "10' 2 1/2\""))
+        self.assertEqual(pieces[1:3], MeasurementArray(["2'", "1' 1/64\""]))
+        pieces.sort()
+        self.assertEqual([str(piece) for piece in pieces], ['3/4"', '5"', "1' 1/64\"", "2'", "10' 2 1/2\""])
+        pieces.append('1"')  # the buffer is not left locked by the sort
+        self.assertEqual(len(pieces), 6)
+        self.assertEqual(self.calc.measurements("1' + 3/4\" x 2"), [Measurement("1'"), Measurement('3/4"')])
+
+    def test_load_measurements(self):
+        """Test memory-mapped loading of CSV columns and plain text files"""
+        with tempfile.NamedTemporaryFile('wb', suffix='.csv', delete=False) as f:
+            f.write(b'part,length,qty\r\n'
+                    b'a,"10\' 2 1/2""",3\r\n'
+                    b'b,3/4",1\r\n'
+                    b'c,12.5,2\r\n'
+                    b'd,bogus,1\r\n'
+                    b'e\r\n'
+                    b'g,,1\r\n')
+        self.addCleanup(os.remove, f.name)
+        for chunk_size in (1, 1 << 20):
+            with self.subTest(chunk_size=chunk_size):
+                lengths, errors = load_measurements(f.name, 'length', chunk_size=chunk_size)
+                self.assertEqual(lengths, MeasurementArray(["10' 2 1/2\"", '3/4"', 12.5]))
+                self.assertEqual([(e.offset, e.text) for e in errors], [(58, 'bogus'), (67, 'e')])
+                self.assertIn('no column 1', errors[1].error)
+
+        lines = ["1'", '', '3/4"', "  5' 6 1/8\" ", '2 1/4', '1/0"', '7']
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        self.addCleanup(os.remove, f.name)
+        lengths, errors = load_measurements(f.name)
+        self.assertEqual(lengths, MeasurementArray(["1'", '3/4"', "5' 6 1/8\"", '2 1/4"', '7"']))
+        self.assertEqual([(e.offset, e.text) for e in errors], [(28, '1/0"')])
+
+        # Lengths past the int64 range of the tick array are bad rows, not a failed load
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+            f.write("1'\n99999999999999999999999'\n-99999999999999999999999\n2\"\n")
+        self.addCleanup(os.remove, f.name)
+        lengths, errors = load_measurements(f.name)
+        self.assertEqual(lengths, MeasurementArray(["1'", '2"']))
+        self.assertEqual([e.text for e in errors], ["99999999999999999999999'", '-99999999999999999999999'])
+
+    def test_dimension_model(self):
+        """Test named dimensions, downstream-only recomputation and cycle detection"""
+        for exact in (False, True):
+            with self.subTest(exact=exact):
+                model = DimensionModel(FeetInchesCalculator(exact=exact))
+                model.define_line("wall = 12' 6\"")
+                model.define_line('stud = wall - 3 x 1 1/2"')
+                model.define('half', 'stud / 2')
+                model.define('door', "6' 8\"")
+                self.assertEqual(model.value('half'), 72.75)
+                self.assertEqual(model.evaluate('half + door'), 152.75)
+                self.assertEqual(model.dependencies('stud'), {'wall'})
+
+                # Only wall and what depends on it are recomputed
+                self.assertEqual(model.define('wall', "10'"), {'wall', 'stud', 'half'})
+                self.assertIn('door', model._values)
+                self.assertEqual(model.value('half'), 57.75)
+
+                with self.assertRaisesRegex(ValueError, 'circular reference'):
+                    model.define('wall', 'half + 1"')
+                self.assertEqual(model.expression('wall'), "10'")
+                model.define('gap', 'missing + 1"')
+                with self.assertRaisesRegex(ValueError, "unknown dimension 'missing'"):
+                    model.value('gap')
+
+        model = DimensionModel()
+        for name in ('x', 'X', 'x1', 'mm', 'cm', 'm'):
+            with self.subTest(name=name), self.assertRaisesRegex(ValueError, 'Invalid dimension name'):
+                model.define(name, "1'")
+
+        chain = DimensionModel()
+        chain.define('d0', '1"')
+        for i in range(1, 3000):
+            chain.define(f'd{i}', f'd{i - 1} + 1/64"')
+        self.assertEqual(chain.value('d2999'), 1 + 2999 / 64)
+
+    def test_differential_fuzzer(self):
+        """Test the fuzz harness agrees with the engine and minimizes a planted fault"""
+        fuzzer = fuzz_calculator.DifferentialFuzzer(seed=7)
+        self.assertEqual(fuzzer.run(400), 400)
+        self.assertEqual(fuzzer.mismatches, [])
+        self.assertIn('evaluate_exact', fuzzer.throughput())
+
+        # A path that mishandles division must be caught and shrunk to a small reproducer
+        rng = fuzz_calculator.random.Random(3)
+        tree = ('add', ' + ', fuzz_calculator.random_tree(rng, 3),
+                ('scale', ' / ', ('measure', "10' 3 1/2\"", fuzz_calculator.Fraction(123.5)), '4', False))
+        divides = lambda candidate: '/ ' in fuzz_calculator.render(candidate)
+        self.assertEqual(fuzz_calculator.render(fuzz_calculator.minimize_tree(tree, divides)), '1" / 2')
+        self.assertEqual(fuzz_calculator.minimize_text("10' + 6\" # 2", lambda text: '#' in text), '#')
+
+    def test_shared_calculator_across_threads(self):
+        """Test one calculator shared by many threads gives consistent results and counters"""
+        expressions = ["%d' %d\" + %d/16\" x %d" % (i % 20, i % 12, i % 15 + 1, i % 7 + 1) for i in range(600)]
+        expected = [self.calc.evaluate_expression(e) for e in expressions]
+        shared = FeetInchesCalculator(cache_size=256)
+        self.assertGreater(len(shared._stripes), 1)
+        failures = []
+
+        def work(offset):
+            for i in range(2000):
+                index = (i * 7 + offset) % len(expressions)
+                if shared.evaluate_expression(expressions[index]) != expected[index]:
+                    failures.append(expressions[index])
+                if i % 500 == 0:
+                    shared.enable_profiling() if offset % 2 else shared.disable_profiling()
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)
+        try:
+            threads = [threading.Thread(target=work, args=(offset,)) for offset in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(failures, [])
+        info = shared.cache_info()
+        self.assertEqual(info.hits + info.misses, 8 * 2000)
+        self.assertLessEqual(info.currsize, 256)
+
+        results = list(shared.evaluate_many(expressions + ['10 11'], workers=4, chunk_size=50))
+        self.assertEqual([r.value for r in results[:-1]], expected)
+        self.assertIn("Found number '10'", results[-1].error)
+        self.assertEqual(list(shared.evaluate_many(expressions[:3], workers=1)),
+                         list(shared.evaluate_many(expressions[:3], workers=2)))
+
+    def test_metric_units(self):
+        """Test mm, cm and m inputs, exact conversion and metric output"""
+        test_cases = [
+            ("2440mm + 3' 6\"", 2440 / 25.4 + 42),
+            ('1.2 m', 1200 / 25.4),
+            ('25.4mm x 2', 2.0),
+            ('100cm - 1m', 0.0),
+            ("1' + 2 x 12.7mm", 13.0),
+        ]
+        for expression, expected in test_cases:
+            with self.subTest(expression=expression):
+                self.assertAlmostEqual(self.calc.evaluate_expression(expression), expected, places=9)
+
+        exact = FeetInchesCalculator(exact=True)
+        self.assertEqual(exact.evaluate_ticks('254mm'), 640)
+        self.assertEqual(Measurement('25.4cm'), Measurement('10"'))
+        self.assertAlmostEqual(self.calc.parse_measurement('1m'), 1000 / 25.4)
+
+        self.assertEqual(self.calc.format_result(96, unit='mm'), '2438.4mm')
+        self.assertEqual(self.calc.format_result(96, '1mm', unit='mm'), '2438mm')
+        # Display rounding is exact, with ties away from zero
+        for inches, text in ((0.25, '6.4mm'), (0.75, '19.1mm'), (2.75, '69.9mm'), (0.125, '3.2mm'),
+                             (1.25, '31.8mm'), (-0.25, '-6.4mm'), (0, '0mm'), (0.001, '0mm')):
+            with self.subTest(inches=inches):
+                self.assertEqual(self.calc.format_result(inches, unit='mm'), text)
+        self.assertEqual(self.calc.format_result(96, unit='m'), '2.4384m')
+        self.assertEqual(self.calc.format_result(-0.001, unit='cm'), '0cm')
+        self.assertEqual(FeetInchesCalculator(unit='cm').format_many([1, 12]), ['2.54cm', '30.48cm'])
+        self.assertEqual(self.calc.format_result(2440 / 25.4, '1/16"'), "8' 1/16\"")
+        with self.assertRaises(ValueError):
+            self.calc.format_result(1, unit='furlong')
+
+        # A unit glued to a name is still a name
+        self.assertFalse(self.calc.validate_expression('5mmx')[0])
+
+    def test_result_cache(self):
+        """Test the persistent result cache across instances, versions and eviction"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'results.sqlite')
+
+        with ResultCache(path) as cache:
+            calculator = FeetInchesCalculator(result_cache=cache)
+            self.assertEqual(calculator.evaluate_expression("10' + 6\""), 126.0)
+            self.assertEqual(calculator.solve("10' + 6 1/16\"", '1/8"'), (126.0625, "10' 6 1/8\""))
+            with self.assertRaises(ValueError):
+                calculator.evaluate_expression('10 11')
+            self.assertEqual(cache.info().misses, 3)
+
+        # A new session reuses stored results and errors without evaluating
+        with ResultCache(path) as cache:
+            calculator = FeetInchesCalculator(result_cache=cache)
+            calculator.compile_expression = None
+            self.assertEqual(calculator.evaluate_expression("10'  +  6\""), 126.0)
+            self.assertEqual(calculator.solve("10' + 6 1/16\"", '1/8"'), (126.0625, "10' 6 1/8\""))
+            with self.assertRaisesRegex(ValueError, "Found number '10'"):
+                calculator.evaluate_expression('10 11')
+            self.assertEqual(cache.info()[:2], (3, 0))
+
+        # Exact mode, ticks and other formatting options get their own entries
+        with ResultCache(path) as cache:
+            exact = FeetInchesCalculator(exact=True, result_cache=cache)
+            self.assertEqual(exact.evaluate_ticks("1/3\" * 3"), 63)
+            self.assertEqual(FeetInchesCalculator(result_cache=cache).solve("10' + 6 1/16\"", '1/4"')[1], "10' 6\"")
+            self.assertEqual(cache.info().hits, 0)
+
+        # A new cache version drops old entries
+        with ResultCache(path, version=2) as cache:
+            self.assertEqual(cache.info().entries, 0)
+
+        # Least recently used entries are evicted past max_entries
+        with ResultCache(path, max_entries=10, flush_every=1) as cache:
+            calculator = FeetInchesCalculator(result_cache=cache)
+            for inches in range(25):
+                calculator.evaluate_expression(f'{inches}"')
+            self.assertLessEqual(cache.info().entries, 10)
+
+        self.assertEqual([r.value for r in evaluate_parallel(['1\'', '2\''], workers=2, result_cache=path)],
+                         [12.0, 24.0])
+        with ResultCache(path) as cache:
+            self.assertIsNotNone(cache.get("e|0|64|2'"))
+
+    def test_aggregate(self):
+        """Test streaming exact totals, mean and histogram over mixed inputs"""
+        calc = FeetInchesCalculator()
+        values = iter(['1/64"'] * 10000 + ["5' 11\"", '', "1' + 6 1/2\"", '10 11', '3 1/2', '1/0"',
+                                           Measurement('2"'), 0.5, '3'])
+        totals = calc.aggregate(values, bucket_width='6"')
+        self.assertEqual((totals.count, totals.errors), (10006, 2))
+        self.assertEqual(totals.total, 10000 + 71 * 64 + 18 * 64 + 32 + 224 + 128 + 32 + 192)
+        self.assertEqual((totals.minimum, totals.maximum), (1, 71 * 64))
+        self.assertEqual(totals.mean, Fraction(totals.total, 10006))
+        self.assertEqual(totals.histogram(), [(0, 10004), (18 * 64, 1), (66 * 64, 1)])
+        self.assertEqual(calc.aggregate(['3', '7', '2.5', '25.4mm']).total, (3 + 7 + 2.5 + 1) * 64)
+
+        # Same ticks as evaluating each line, in both modes and other resolutions
+        lines = ["2' 3 5/64\"", '1.37"', '25.4mm', "1/3\" * 3", "2' - 30\""]
+        for options in ({}, {'exact': True}, {'resolution': 16}):
+            with self.subTest(options=options):
+                calc = FeetInchesCalculator(**options)
+                totals = calc.aggregate(lines)
+                self.assertEqual(totals.total, sum(calc.evaluate_ticks(line) for line in lines))
+                self.assertEqual(totals.minimum, calc.evaluate_ticks("2' - 30\""))
+
+        self.assertIsNone(FeetInchesCalculator().aggregate([]).mean)
+        with self.assertRaises(ValueError):
+            FeetInchesCalculator().aggregate(['1"'], bucket_width='0"')
+
+    def test_cut_optimizer(self):
+        """Test cut planning: kerf handling, stock choice, validity at scale and the report"""
+        # Two 3' 11 15/16" pieces and one kerf fill an 8' board exactly; 4' pieces do not
+        plan = cut_optimizer.optimize_cuts([("3' 11 15/16\"", 4)], ["8'"], time_limit=0)
+        self.assertEqual([board.offcut for board in plan.boards], [0, 0])
+        plan = cut_optimizer.optimize_cuts([("4'", 2)], ["8'", "10'"], time_limit=0)
+        self.assertEqual(plan.stock_counts(), {10 * 768: 1})
+        self.assertEqual(plan.report()[0], "1 x 10': 4', 4' | offcut 1' 11 3/4\"")
+        self.assertEqual(plan.report()[-1], "Pieces: 8'    Waste: 2' (20.0%)")
+
+        # 10k pieces: every piece is placed once, every board holds its cuts,
+        # and improving never uses more stock than the first pass
+        rng = random.Random(7)
+        pieces = [f"{rng.randint(1, 7)}' {rng.randint(0, 11)} {rng.randint(1, 15)}/16\"" for _ in range(10000)]
+        kerf = 8
+        first = cut_optimizer.optimize_cuts(pieces, time_limit=0)
+        plan = cut_optimizer.optimize_cuts(pieces, time_limit=0.5)
+        expected = sorted(Measurement(piece).ticks for piece in pieces)
+        self.assertEqual(sorted(ticks for board in plan.boards for ticks in board.pieces), expected)
+        for board in plan.boards:
+            self.assertLessEqual(sum(board.pieces) + kerf * (len(board.pieces) - 1), board.stock)
+            self.assertIn(board.stock, (8 * 768, 10 * 768, 12 * 768, 16 * 768))
+        self.assertLessEqual(plan.stock_used, first.stock_used)
+        self.assertEqual(plan.waste, plan.stock_used - sum(expected))
+
+        self.assertEqual(cut_optimizer.read_cut_list(["2' 6\", 4", '', '1 1/2"']), [("2' 6\"", 4), ('1 1/2"', 1)])
+        with self.assertRaisesRegex(ValueError, "longer than the longest stock length 16'"):
+            cut_optimizer.optimize_cuts(["17'"])
+        with self.assertRaises(ValueError):
+            cut_optimizer.optimize_cuts(['0"'])
+
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            self.assertEqual(cut_optimizer.main([os.path.join(tempfile.gettempdir(), 'missing-cut-list.txt')]), 1)
+        self.assertIn('missing-cut-list.txt', stderr.getvalue())
+
+    def test_find_combinations(self):
+        """Test subset-sum search against brute force, tolerance, quantities and streaming"""
+        rng = random.Random(3)
+        for _ in range(100):
+            pieces = [rng.choice((1, 2, 3, 5, 8, 13)) + rng.choice((0, 0, 0.125)) for _ in range(rng.randint(1, 8))]
+            target, tolerance = rng.randint(0, 25), rng.choice((0, 0, 0.0625, 0.25))
+            expected = {tuple(sorted(group, reverse=True))
+                        for size in range(1, len(pieces) + 1) for group in itertools.combinations(pieces, size)
+                        if abs(sum(group) - target) <= tolerance}
+            found = [tuple(piece.inches for piece in combination.pieces)
+                     for combination in calculator_engine.find_combinations(target, pieces, tolerance)]
+            with self.subTest(pieces=pieces, target=target, tolerance=tolerance):
+                self.assertEqual(len(found), len(set(found)))
+                self.assertEqual(set(found), expected)
+
+        combinations = list(calculator_engine.find_combinations("16' 3/8\"", [("8'", 3), ("4' 1/4\"", 2), '1/8"'],
+                                                                '3/8"'))
+        self.assertEqual([[str(piece) for piece in combination.pieces] for combination in combinations],
+                         [["8'", "8'"], ["8'", "8'", '1/8"'], ["8'", "4' 1/4\"", "4' 1/4\""],
+                          ["8'", "4' 1/4\"", "4' 1/4\"", '1/8"']])
+        self.assertEqual([str(combination.difference) for combination in combinations],
+                         ['-3/8"', '-1/4"', '1/8"', '1/4"'])
+
+        # Answers stream: the first arrives without enumerating the rest
+        pieces = [f"{rng.randint(1, 8)}' {rng.randint(0, 11)} {rng.randint(1, 7)}/8\"" for _ in range(300)]
+        first = next(calculator_engine.find_combinations("16' 3/8\"", pieces, '1/16"'))
+        self.assertLessEqual(abs(first.difference.ticks), 4)
+        self.assertEqual(sum(piece.ticks for piece in first.pieces), first.total.ticks)
+
+        with self.assertRaises(ValueError):
+            list(calculator_engine.find_combinations('1"', ['0"']))
+        with self.assertRaisesRegex(ValueError, 'Calculation Error: piece quantities cannot be negative'):
+            list(calculator_engine.find_combinations('1"', [('1"', -1)]))
+        self.assertEqual(list(calculator_engine.find_combinations('1"', [('1"', 0)])), [])
+
 
 def run_tests():
     """Run all tests and return success status"""